@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the providers' batch endpoints, for testing batch mode without network.
+
+Speaks the protocol of graph.utils.batch_providers.LocalBatchProvider. Responses come from
+the benchmark stub models: a plan for OpenAI models and a valid change list for Anthropic
+models. A batch ends `--complete-after` seconds after it was submitted.
+
+    python benchmarks/batch_standin_server.py --port 8765 &
+    VIBE_BATCH_BACKEND=local python cli/vibe.py batch --wait --poll 1
+"""
+import argparse
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_llms import PLAN, FakeModelFactory, changes_payload
+from graph.utils.llm import provider_for
+
+DEFAULT_PROFILES = {
+    "openai": {"latency_ms": 0, "jitter_ms": 0, "output_tokens": 600},
+    "anthropic": {"latency_ms": 0, "jitter_ms": 0, "output_tokens": 900},
+}
+
+
+class StandInBatches:
+    """In-memory batches answered by a FakeModelFactory."""
+
+    def __init__(self, factory: FakeModelFactory, complete_after_s: float = 0.0, fail_every: int = 0):
+        self.factory = factory
+        self.complete_after_s = complete_after_s
+        self.fail_every = fail_every
+        self.batches = {}
+        self._ids = itertools.count(1)
+        self._requests = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, requests):
+        with self._lock:
+            batch_id = f"standin_batch_{next(self._ids)}"
+            self.batches[batch_id] = {"requests": requests, "submitted_at": time.time(), "results": None}
+        return batch_id
+
+    def status(self, batch_id):
+        batch = self.batches[batch_id]
+        return "ended" if time.time() - batch["submitted_at"] >= self.complete_after_s else "in_progress"
+
+    def results(self, batch_id):
+        batch = self.batches[batch_id]
+        with self._lock:
+            if batch["results"] is None:
+                batch["results"] = {r["custom_id"]: self._answer(r) for r in batch["requests"]}
+        return batch["results"]
+
+    def _answer(self, request):
+        if self.fail_every and next(self._requests) % self.fail_every == 0:
+            return {"content": None, "input_tokens": 0, "output_tokens": 0, "error": "request errored"}
+        model = self.factory(provider_for(request["model"]), request["model"], request["temperature"])
+        response = model.invoke(request["prompt"])
+        usage = response.response_metadata["usage"]
+        return {"content": response.content, "input_tokens": usage["input_tokens"],
+                "output_tokens": usage["output_tokens"], "error": None}
+
+
+def make_handler(batches: StandInBatches):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/batches":
+                return self._reply(404, {"error": "not found"})
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            self._reply(200, {"id": batches.submit(body["requests"])})
+
+        def do_GET(self):
+            match = re.fullmatch(r"/batches/([\w-]+)(/results)?", self.path.rstrip("/"))
+            if not match or match.group(1) not in batches.batches:
+                return self._reply(404, {"error": "not found"})
+            if match.group(2):
+                if batches.status(match.group(1)) != "ended":
+                    return self._reply(409, {"error": "batch has not ended"})
+                return self._reply(200, {"results": batches.results(match.group(1))})
+            self._reply(200, {"status": batches.status(match.group(1))})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, complete_after_s: float = 0.0, fail_every: int = 0):
+    """Starts the stand-in on a background thread. Returns (server, url); stop it with server.shutdown()."""
+    factory = FakeModelFactory({"openai": [PLAN], "anthropic": [changes_payload()]}, DEFAULT_PROFILES, latency_scale=0)
+    server = ThreadingHTTPServer((host, port), make_handler(StandInBatches(factory, complete_after_s, fail_every)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the providers' batch endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--complete-after", type=float, default=2.0, help="Seconds until a submitted batch ends")
+    parser.add_argument("--fail-every", type=int, default=0, help="Make every Nth request fail (0 = never)")
+    args = parser.parse_args()
+
+    server, url = start_server(args.host, args.port, args.complete_after, args.fail_every)
+    print(f"🧪 Batch stand-in listening on {url} (batches end after {args.complete_after}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Deterministic stub chat models for offline benchmarks.
+
+They mimic the parts of the LangChain chat model interface the graph uses
+(`invoke()` returning an object with `content` and `response_metadata`), with
+configurable latency and token counts and scripted responses per model.
+"""
+import json
+import random
+import threading
+import time
+from typing import Dict, List
+
+
+class FakeResponse:
+    def __init__(self, content: str, input_tokens: int, output_tokens: int):
+        self.content = content
+        # Both the OpenAI ("token_usage") and Anthropic ("usage") metadata shapes.
+        self.response_metadata = {
+            "token_usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens},
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        }
+
+
+class FakeChatModel:
+    """A stub chat model that sleeps for its profile's latency and replays scripted responses."""
+
+    def __init__(self, factory: "FakeModelFactory", provider: str, model: str, temperature: float):
+        self.factory = factory
+        self.provider = provider
+        self.model = model
+        self.temperature = temperature
+
+    def invoke(self, prompt: str) -> FakeResponse:
+        profile = self.factory.profile_for(self.provider)
+        latency_s = max(0.0, profile["latency_ms"] + self.factory.rng_uniform(profile["jitter_ms"])) / 1000
+        time.sleep(latency_s * self.factory.latency_scale)
+        content = self.factory.next_response(self.provider, self.model)
+        input_tokens = profile.get("input_tokens") or len(prompt) // 4
+        return FakeResponse(content, input_tokens, profile["output_tokens"])
+
+
+class FakeModelFactory:
+    """
+    Callable for graph.utils.llm.set_chat_model_factory().
+    `responses` maps a provider ("openai"/"anthropic") to either a list of responses or
+    a dict of model name -> list ("default" covers unlisted models). Each call pops the
+    next response of its list; the last one is repeated once the list is exhausted.
+    """
+
+    def __init__(self, responses: Dict, profiles: Dict, latency_scale: float = 1.0, seed: int = 0):
+        self.responses = responses
+        self.profiles = profiles
+        self.latency_scale = latency_scale
+        self.calls: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, provider: str, model: str, temperature: float) -> FakeChatModel:
+        return FakeChatModel(self, provider, model, temperature)
+
+    def profile_for(self, provider: str) -> Dict:
+        return self.profiles[provider]
+
+    def rng_uniform(self, spread: float) -> float:
+        with self._lock:
+            return self._rng.uniform(-spread, spread)
+
+    def next_response(self, provider: str, model: str) -> str:
+        scripted = self.responses[provider]
+        if isinstance(scripted, dict):
+            key = model if model in scripted else "default"
+            scripted = scripted[key]
+        else:
+            key = "default"
+        with self._lock:
+            counter = f"{provider}:{key}"
+            index = self.calls.get(counter, 0)
+            self.calls[counter] = index + 1
+        return scripted[min(index, len(scripted) - 1)]
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+# --- Canned payloads ---
+
+PLAN = "\n".join(
+    f"{i}) Requirement {i}: keep the change minimal, covered by tests and the backtest." for i in range(1, 40)
+)
+
+
+def changes_payload(files: int = 1, lines_per_file: int = 20) -> str:
+    """A valid dev response adding `files` modules of `lines_per_file` lines each."""
+    changes = [
+        {
+            "file": f"strategies/generated/module_{i}.py",
+            "action": "add",
+            "content": "\n".join(f"VALUE_{j} = {j}" for j in range(lines_per_file)) + "\n",
+        }
+        for i in range(files)
+    ]
+    return json.dumps({"changes": changes})
+
+
+INVALID_JSON = '{"changes": [{"file": "a.py", "action": "add", "content": "x = 1"'
+MISSING_CHANGES = json.dumps({"files": [{"file": "a.py", "content": "x = 1"}]})
+SCHEMA_INVALID = json.dumps({"changes": [{"file": "a.py", "action": "rename", "content": ""}]})
+UNAPPLIABLE_PATCH = json.dumps({"changes": [{
+    "file": "specs/ProjectSpec.yaml",
+    "action": "patch",
+    "hunks": [{"search": "this text is not in the file", "replace": "x"}],
+}]})
+
+INVALID_RESPONSES: List[str] = [INVALID_JSON, MISSING_CHANGES, SCHEMA_INVALID, UNAPPLIABLE_PATCH]
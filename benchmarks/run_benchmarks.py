@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmarks for the agent graph.
+
+Runs the full planner -> dev -> executor -> gate graph (and the best-of-N variant)
+against deterministic stub chat models, so results need no API keys and carry no
+network noise. Each scenario runs in a scratch directory with a local executor and
+a seeded simulated backtest.
+
+    python benchmarks/run_benchmarks.py                    # run and compare with the baseline
+    python benchmarks/run_benchmarks.py --save-baseline    # store these results as the new baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.fake_llms import FakeModelFactory, PLAN, changes_payload, INVALID_RESPONSES
+from graph.utils.llm import set_chat_model_factory
+
+BASELINE_PATH = REPO_ROOT / "benchmarks" / "baseline.json"
+RESULTS_PATH = REPO_ROOT / "benchmarks" / "results" / "latest.json"
+
+DEFAULT_PROFILES = {
+    "openai": {"latency_ms": 40, "jitter_ms": 10, "output_tokens": 900},
+    "anthropic": {"latency_ms": 60, "jitter_ms": 15, "output_tokens": 1800},
+}
+
+SCENARIOS = {
+    # One plan, one valid change set, gate passes on the first loop.
+    "happy_path": {
+        "prefer": "best-quality",
+        "responses": {"openai": [PLAN], "anthropic": [changes_payload(files=3)]},
+    },
+    # Cheap model first; its output fails the fallback check so every dev step calls two models.
+    "cheap_fallback": {
+        "prefer": "cheap-first",
+        "responses": {"openai": [PLAN], "anthropic": {"default": [changes_payload(files=3)]}},
+    },
+    # Invalid JSON, missing `changes`, schema-invalid and unappliable payloads before a valid one.
+    "correction_loop": {
+        "prefer": "best-quality",
+        "responses": {"openai": [PLAN], "anthropic": INVALID_RESPONSES + [changes_payload(files=3)]},
+    },
+    # A large change set that stresses state size, blob offloading and artifact writes.
+    "large_payload": {
+        "prefer": "best-quality",
+        "responses": {"openai": [PLAN], "anthropic": [changes_payload(files=30, lines_per_file=200)]},
+    },
+    # Best-of-N fan-out with three concurrent dev candidates.
+    "best_of_3": {
+        "prefer": "best-quality",
+        "fanout": 3,
+        "responses": {"openai": [PLAN], "anthropic": [changes_payload(files=3)]},
+    },
+}
+
+# Metrics where a higher value is a regression, and the relative tolerance before flagging it.
+COMPARED_METRICS = ("wall_ms_p50", "wall_ms_p95", "peak_traced_mb", "children_max_rss_mb", "artifact_bytes", "llm_calls")
+DEFAULT_TOLERANCE = 0.15
+
+
+def write_bench_spec(workdir: Path, scenario: dict):
+    """Writes a spec with lenient acceptance criteria and a local, seeded backtest command."""
+    spec = yaml.safe_load((REPO_ROOT / "specs" / "ProjectSpec.yaml").read_text(encoding="utf-8"))
+    spec["acceptance"]["backtest"] = {
+        "sample_out_winrate": ">=0.0",
+        "mfe_target": ">=0.0",
+        "mae_limit": "<=1.0",
+        "trades_per_day": "<=100",
+    }
+    spec["routing"]["cost_policy"]["prefer"] = scenario["prefer"]
+    spec["routing"].setdefault("best_of_n", {}).update({"workers": scenario.get("fanout", 1), "max_rounds": 1})
+    spec["executor"] = {
+        "backend": "local",
+        "timeout_s": 120,
+        "commands": [f'"{sys.executable}" "{REPO_ROOT / "scripts" / "backtest.py"}" --out {{artifacts_dir}}/backtest/latest.json --seed 7'],
+    }
+    (workdir / "specs").mkdir(parents=True, exist_ok=True)
+    (workdir / "specs" / "ProjectSpec.yaml").write_text(yaml.safe_dump(spec, allow_unicode=True), encoding="utf-8")
+
+
+def artifact_footprint(root: Path):
+    """Returns (file count, total bytes) written under `root`; hard-linked copies count once."""
+    inodes = {}
+    for p in root.rglob("*"):
+        if p.is_file():
+            stat = p.stat()
+            inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return len(inodes), sum(inodes.values())
+
+
+def run_once(name: str, scenario: dict, latency_scale: float, verbose: bool):
+    """Runs the graph once for `scenario` in the current directory and returns per-run measurements."""
+    from graph.app import build_app
+
+    shutil.rmtree("artifacts", ignore_errors=True)
+    factory = FakeModelFactory(scenario["responses"], DEFAULT_PROFILES, latency_scale=latency_scale)
+    set_chat_model_factory(factory)
+    app = build_app(fanout=scenario.get("fanout", 1))
+
+    node_latency = {}
+    output = io.StringIO()
+    start = time.perf_counter()
+    last = start
+    with contextlib.redirect_stdout(sys.stdout if verbose else output):
+        state = {"task": f"benchmark {name}", "thread_id": f"bench-{name}"}
+        for update in app.stream(state, config={"recursion_limit": 50}, stream_mode="updates"):
+            now = time.perf_counter()
+            for node in update:
+                node_latency.setdefault(node, []).append((now - last) * 1000)
+            last = now
+    wall_ms = (time.perf_counter() - start) * 1000
+    set_chat_model_factory(None)
+
+    files, size = artifact_footprint(Path("artifacts"))
+    return {
+        "wall_ms": wall_ms,
+        "node_latency_ms": node_latency,
+        "llm_calls": factory.total_calls,
+        "dev_iterations": len(node_latency.get("dev", [])) + len(node_latency.get("evaluate", [])),
+        "artifact_files": files,
+        "artifact_bytes": size,
+    }
+
+
+def _max_rss_mb(who: str):
+    """Peak RSS of this process ("self") or of its largest finished child ("children"), None on Windows."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    return round(usage.ru_maxrss / 1024, 2)
+
+
+def memory_run(name: str, scenario: dict, latency_scale: float, verbose: bool, workdir: str) -> dict:
+    """
+    One traced run of a scenario, in a fresh process of its own so that the peak RSS of its
+    children (best-of-N candidate workers, executor commands) covers this scenario alone.
+    tracemalloc only sees the graph process; the children are measured by their peak RSS.
+    """
+    os.chdir(workdir)
+    # Warm up untraced, as the timed runs do for the in-process measurement: imports aren't run costs.
+    run_once(name, scenario, latency_scale, verbose)
+    tracemalloc.start()
+    run_once(name, scenario, latency_scale, verbose)
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "peak_traced_mb": round(peak_traced / 1_048_576, 2),
+        "max_rss_mb": _max_rss_mb("self"),
+        "children_max_rss_mb": _max_rss_mb("children"),
+    }
+
+
+def run_scenario(name: str, scenario: dict, iterations: int, latency_scale: float, verbose: bool) -> dict:
+    """Runs a scenario `iterations` times for timing plus one traced run for memory."""
+    cwd = os.getcwd()
+    workdir = Path(tempfile.mkdtemp(prefix=f"vibe-bench-{name}-"))
+    try:
+        write_bench_spec(workdir, scenario)
+        os.chdir(workdir)
+        runs = [run_once(name, scenario, latency_scale, verbose) for _ in range(iterations)]
+
+        # A separate traced run so tracemalloc overhead doesn't distort the timings above.
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            memory = pool.submit(memory_run, name, scenario, latency_scale, verbose, str(workdir)).result()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    walls = sorted(r["wall_ms"] for r in runs)
+    node_latency = {}
+    for run in runs:
+        for node, samples in run["node_latency_ms"].items():
+            node_latency.setdefault(node, []).extend(samples)
+
+    return {
+        "iterations": iterations,
+        "wall_ms_p50": round(statistics.median(walls), 2),
+        "wall_ms_p95": round(walls[min(len(walls) - 1, int(round(0.95 * (len(walls) - 1))))], 2),
+        "throughput_runs_per_min": round(60_000 * len(walls) / sum(walls), 2),
+        "node_latency_ms": {node: round(statistics.mean(samples), 2) for node, samples in sorted(node_latency.items())},
+        "llm_calls": runs[-1]["llm_calls"],
+        "dev_iterations": runs[-1]["dev_iterations"],
+        "artifact_files": runs[-1]["artifact_files"],
+        "artifact_bytes": runs[-1]["artifact_bytes"],
+        **memory,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Prints per-metric deltas against the baseline and returns the list of regressions."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            print(f"  {name}: no baseline")
+            continue
+        deltas = []
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ""
+            if change > tolerance:
+                flag = " ❌"
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.1%})")
+            deltas.append(f"{metric} {change:+.1%}{flag}")
+        print(f"  {name}: " + ", ".join(deltas))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the VibeCoder agent graph")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only this scenario (repeatable)")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed runs per scenario")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for stub model latency (0 = no sleep)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Store the results as the baseline ({BASELINE_PATH.relative_to(REPO_ROOT)})")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Relative increase tolerated before a metric counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if any metric regressed")
+    parser.add_argument("--verbose", action="store_true", help="Show the graph's own output")
+    args = parser.parse_args()
+
+    print("--- VibeCoder Offline Benchmarks ---")
+    results = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "latency_scale": args.latency_scale,
+        "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        summary = run_scenario(name, SCENARIOS[name], args.iterations, args.latency_scale, args.verbose)
+        results["scenarios"][name] = summary
+        print(f"✅ {name}: p50 {summary['wall_ms_p50']}ms, p95 {summary['wall_ms_p95']}ms, "
+              f"{summary['throughput_runs_per_min']} runs/min, {summary['llm_calls']} LLM calls, "
+              f"peak {summary['peak_traced_mb']}MB traced, RSS {summary['max_rss_mb']}MB (children {summary['children_max_rss_mb']}MB), "
+              f"{summary['artifact_files']} artifacts ({summary['artifact_bytes']} bytes)")
+        print(f"   node latency (ms): {summary['node_latency_ms']}")
+
+    RESULTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    RESULTS_PATH.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nResults saved to {RESULTS_PATH.relative_to(REPO_ROOT)}")
+
+    regressions = []
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Baseline saved to {BASELINE_PATH.relative_to(REPO_ROOT)}")
+    elif BASELINE_PATH.exists():
+        print("\n--- Comparison with baseline ---")
+        baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+        if baseline.get("latency_scale") != args.latency_scale:
+            print(f"⚠️ Baseline was recorded with --latency-scale {baseline.get('latency_scale')}; wall times are not comparable.")
+        regressions = compare(results, baseline, args.tolerance)
+    elif args.fail_on_regression:
+        print(f"\n[RESULT] ❌ No baseline at {BASELINE_PATH.relative_to(REPO_ROOT)}; record one with --save-baseline.")
+        sys.exit(1)
+
+    if regressions:
+        print("\n[RESULT] ❌ Regressions detected:\n" + "\n".join(f"  - {r}" for r in regressions))
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,21 @@ import json
 import shutil
 from pathlib import Path
 from dotenv import load_dotenv
-from slugify import slugify
 
 load_dotenv()
 
 # Add project root to Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from graph.app import build_app
-from scripts.build_knowledge_base import build_knowledge_base
+# Heavy dependencies (langgraph, LLM SDKs, pandas, the knowledge-base stack) are
+# imported inside the handler that needs them so `--help`, `init` etc. start instantly.
 
 def handle_run(args):
     """Handles the 'run' command."""
+    from slugify import slugify
+    from graph.app import run_task
+
     print(f"Starting VibeCoder run with task: '{args.task}'")
-    app = build_app()
     
     # --- Dynamic Thread ID ---
     if args.thread:
@@ -29,9 +30,8 @@ def handle_run(args):
         thread_id = slugify(args.task)
     print(f"Using Thread ID: {thread_id}")
 
-    # Set a recursion limit to prevent infinite loops
-    config = {"recursion_limit": 3, "thread_id": thread_id}
-    out = app.invoke({"task": args.task}, config=config)
+    out = run_task(args.task, thread_id, fanout=args.fanout)
+    # Large fields are printed as blob references; see artifacts/blobs/objects/<sha256>.
     print(json.dumps(out, indent=2, ensure_ascii=False))
 
 def handle_init(args):
@@ -60,10 +60,116 @@ def handle_init(args):
 def handle_knowledge(args):
     """Handles the 'knowledge' command."""
     if args.subcommand == 'build':
+        from scripts.build_knowledge_base import build_knowledge_base
         build_knowledge_base()
     else:
         print(f"Unknown knowledge command: {args.subcommand}")
 
+def handle_gc(args):
+    """Handles the 'gc' command."""
+    from graph.utils.blob_store import collect_garbage, release_thread
+    from utils import artifact_store
+
+    retention = dict(artifact_store.DEFAULT_RETENTION)
+    spec_path = Path("specs/ProjectSpec.yaml")
+    if spec_path.exists():
+        import yaml
+        retention = artifact_store.get_retention(yaml.safe_load(spec_path.read_text(encoding="utf-8")) or {})
+    if args.keep_iterations is not None:
+        retention["keep_iterations"] = args.keep_iterations
+    if args.max_age_days is not None:
+        retention["max_age_days"] = args.max_age_days
+
+    for thread_id in args.release or []:
+        release_thread(thread_id)
+        print(f"Released blob references held by thread '{thread_id}'.")
+    removed = collect_garbage(grace_seconds=args.grace, max_age_days=retention["max_age_days"])
+    print(f"✅ Removed {removed} unreferenced blob(s).")
+
+    runs, objects = artifact_store.compact(grace_seconds=args.grace, **retention)
+    print(f"✅ Removed {runs} old run artifact folder(s) and {objects} unreferenced artifact object(s).")
+
+def handle_enqueue(args):
+    """Handles the 'enqueue' command."""
+    from slugify import slugify
+    from utils.job_queue import connect, enqueue, depth
+
+    conn = connect(args.queue)
+    for task in args.task:
+        thread_id = args.thread if args.thread and len(args.task) == 1 else slugify(task)
+        job = enqueue(conn, task, thread_id, fanout=args.fanout, max_attempts=args.max_attempts)
+        if job["created"]:
+            print(f"✅ Enqueued job {job['id']} (thread '{thread_id}')")
+        else:
+            print(f"Thread '{thread_id}' is already queued as job {job['id']} ({job['status']}); skipped.")
+    counts = depth(conn)
+    print(f"Queue: {counts['queued']} queued, {counts['batched']} batched, {counts['running']} running, {counts['done']} done, {counts['failed']} failed")
+
+def handle_worker(args):
+    """Handles the 'worker' command."""
+    from graph.app import run_task
+    from utils.job_queue import run_workers
+
+    print(f"Starting {args.concurrency} VibeCoder worker(s)")
+    run_workers(run_task, concurrency=args.concurrency, db_path=args.queue, lease_s=args.lease,
+                poll_s=args.poll, exit_when_empty=args.drain)
+
+def handle_batch(args):
+    """Handles the 'batch' command."""
+    import yaml
+    from graph.batch import connect, run
+    from utils.job_queue import depth
+
+    if args.backend:
+        os.environ["VIBE_BATCH_BACKEND"] = args.backend
+    spec = yaml.safe_load(Path("specs/ProjectSpec.yaml").read_text(encoding="utf-8")) or {}
+    conn = connect(args.queue)
+    totals = run(conn, spec, limit=args.limit, wait=args.wait, poll_s=args.poll)
+    counts = depth(conn)
+    print(f"✅ Batch mode: {totals['submitted']} prompt(s) submitted, {totals['done']} result(s) recorded, "
+          f"{totals['failed']} failed, {totals['released']} job(s) released to workers, "
+          f"{totals['pending_batches']} batch(es) still pending")
+    print(f"Queue: {counts['queued']} queued, {counts['batched']} batched, {counts['running']} running, "
+          f"{counts['done']} done, {counts['failed']} failed")
+
+def handle_stats(args):
+    """Handles the 'stats' command."""
+    from utils.metrics_index import stats
+
+    group_by = [column.strip() for column in args.by.split(",") if column.strip()] if args.by else None
+    try:
+        result = stats(group_by, thread_id=args.thread, run_id=args.run, task_id=args.task_id,
+                       since_days=args.since_days, limit=args.limit)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    rows = result["rows"]
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+        return
+    if not rows:
+        print("No matching metrics. Runs are logged to artifacts/logs/observability_log.csv.")
+        return
+
+    columns = [c for c in rows[0] if c not in ("first_ts", "succeeded")]
+    def cell(row, column):
+        value = row[column]
+        if column == "cost_usd":
+            return f"${value or 0:.4f}"
+        if column in ("latency_ms", "max_latency_ms"):
+            return f"{(value or 0) / 1000:.1f}s"
+        if column == "task":
+            return (value or "")[:40]
+        return "" if value is None else str(value)
+    table = [[column.replace("_ms", "") for column in columns]] + [[cell(row, c) for c in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print("  ".join(value.ljust(width) for value, width in zip(line, widths)))
+    total_cost = sum(row["cost_usd"] or 0 for row in rows)
+    total_latency = sum(row["latency_ms"] or 0 for row in rows)
+    print(f"\nTotal: ${total_cost:.4f}, {total_latency / 1000:.1f}s across {sum(row['calls'] for row in rows)} call(s) "
+          f"({result['query_ms']}ms, {result['indexed_rows']} new log row(s) indexed)")
+
 def main():
     parser = argparse.ArgumentParser(description="VibeCoder CLI")
     subparsers = parser.add_subparsers(dest="command", required=True, help="Available commands")
@@ -72,6 +178,7 @@ def main():
     parser_run = subparsers.add_parser("run", help="Run the VibeCoder agent workflow")
     parser_run.add_argument("--task", default="demo task", help="The task for the AI agents to execute")
     parser_run.add_argument("--thread", help="Specify a custom thread_id for the run. Defaults to a slug of the task.")
+    parser_run.add_argument("--fanout", type=int, help="Generate N dev candidates in parallel and keep the best one that passes the gate. Defaults to routing.best_of_n.candidates in the spec.")
     parser_run.set_defaults(func=handle_run)
 
     # --- Init Command ---
@@ -85,6 +192,49 @@ def main():
     parser_kb_build = knowledge_subparsers.add_parser("build", help="Build the vector store from documents")
     parser_kb_build.set_defaults(func=handle_knowledge)
 
+    # --- GC Command ---
+    parser_gc = subparsers.add_parser("gc", help="Garbage-collect unreferenced state blobs and apply the run-artifact retention policy")
+    parser_gc.add_argument("--release", action="append", metavar="THREAD", help="Drop a finished thread's references first (repeatable)")
+    parser_gc.add_argument("--grace", type=float, default=3600, help="Keep unreferenced blobs and artifact objects younger than this many seconds")
+    parser_gc.add_argument("--keep-iterations", type=int, help="Run artifact folders to keep per thread (default: artifacts.retention in the spec)")
+    parser_gc.add_argument("--max-age-days", type=float, help="Remove the artifacts and blob references of threads untouched for this long (default: artifacts.retention in the spec)")
+    parser_gc.set_defaults(func=handle_gc)
+
+    # --- Queue Commands ---
+    parser_enqueue = subparsers.add_parser("enqueue", help="Add tasks to the job queue for 'vibe worker' to run")
+    parser_enqueue.add_argument("--task", action="append", required=True, help="Task to enqueue (repeatable)")
+    parser_enqueue.add_argument("--thread", help="Custom thread_id (single task only). Defaults to a slug of the task; a thread is only ever enqueued once.")
+    parser_enqueue.add_argument("--fanout", type=int, help="Best-of-N candidates for this task (see 'run --fanout')")
+    parser_enqueue.add_argument("--max-attempts", type=int, default=3, help="Attempts before a crashing task is marked failed")
+    parser_enqueue.add_argument("--queue", help="Queue database. Defaults to $VIBE_QUEUE_DB or artifacts/queue/jobs.db")
+    parser_enqueue.set_defaults(func=handle_enqueue)
+
+    parser_worker = subparsers.add_parser("worker", help="Claim and run queued tasks")
+    parser_worker.add_argument("--concurrency", type=int, default=1, help="Number of worker processes")
+    parser_worker.add_argument("--lease", type=float, default=300, help="Lease length in seconds; renewed by heartbeats while a task runs")
+    parser_worker.add_argument("--poll", type=float, default=2.0, help="Seconds between polls of an empty queue")
+    parser_worker.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+    parser_worker.add_argument("--queue", help="Queue database. Defaults to $VIBE_QUEUE_DB or artifacts/queue/jobs.db")
+    parser_worker.set_defaults(func=handle_worker)
+
+    parser_batch = subparsers.add_parser("batch", help="Plan and draft queued tasks through the providers' batch endpoints at batch prices")
+    parser_batch.add_argument("--limit", type=int, help="Queued jobs to take into batch mode (default: routing.batch.max_jobs in the spec)")
+    parser_batch.add_argument("--wait", action="store_true", help="Poll until every batch has been collected and its jobs released to workers")
+    parser_batch.add_argument("--poll", type=float, help="Seconds between polls with --wait (default: routing.batch.poll_s in the spec)")
+    parser_batch.add_argument("--backend", choices=["provider", "local"], help="'local' uses the stand-in server (benchmarks/batch_standin_server.py). Defaults to $VIBE_BATCH_BACKEND or routing.batch.backend")
+    parser_batch.add_argument("--queue", help="Queue database. Defaults to $VIBE_QUEUE_DB or artifacts/queue/jobs.db")
+    parser_batch.set_defaults(func=handle_batch)
+
+    # --- Stats Command ---
+    parser_stats = subparsers.add_parser("stats", help="Cost and latency per thread, run, iteration, node and model")
+    parser_stats.add_argument("--thread", help="Break down one thread by run, iteration, node and model")
+    parser_stats.add_argument("--run", help="Break down one run (run_id column of the log)")
+    parser_stats.add_argument("--task-id", help="Break down every run of one task (task_id column of the log)")
+    parser_stats.add_argument("--by", help="Comma-separated grouping, e.g. 'node_name,model'. Columns: thread_id, run_id, iteration, node_name, model, task_id, status")
+    parser_stats.add_argument("--since-days", type=float, help="Only count metrics from the last N days")
+    parser_stats.add_argument("--limit", type=int, default=20, help="Threads to list when no filter is given (most expensive first)")
+    parser_stats.add_argument("--json", action="store_true", help="Print rows as JSON")
+    parser_stats.set_defaults(func=handle_stats)
 
     args = parser.parse_args()
     args.func(args)
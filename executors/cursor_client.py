@@ -1,14 +1,14 @@
-import json
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 
-def handoff_to_cursor_background(payload: Dict):
+from utils import artifact_store
+
+def handoff_to_cursor_background(payload: Dict, run_dir: Optional[Path] = None):
     """
     Dumps the task payload to a JSON file for the Cursor Background Agent.
+    With `run_dir` the payload is also kept with that run's artifacts.
     """
-    # Ensure the directory exists
-    output_path = Path("artifacts/exec/task.json")
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w', encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
+    if run_dir is not None:
+        artifact_store.write_json(Path(run_dir) / "exec" / "task.json", payload)
+    # The agent picks up the fixed path; the write is atomic so it never sees a partial file.
+    artifact_store.write_json(Path("artifacts/exec/task.json"), payload)
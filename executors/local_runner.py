@@ -0,0 +1,253 @@
+import json
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from executors.patching import apply_changes
+from utils import artifact_store
+
+STATUS_FILE = Path("artifacts/exec/status.json")
+LOG_DIR = Path("artifacts/exec/logs")
+DEFAULT_TIMEOUT_S = 600
+
+# Commands are matched to well-known job names so DAG dependencies can refer to them.
+KNOWN_JOBS = {
+    "ruff": "lint",
+    "pytest": "tests",
+    "scripts/backtest.py": "backtest",
+    "mypy": "typecheck",
+    "scripts/generate_charts.py": "charts",
+}
+# Implicit dependencies between well-known jobs (job -> jobs it needs).
+KNOWN_NEEDS = {
+    "charts": ["backtest"],
+}
+
+
+def plan_jobs(commands: List, default_timeout_s: int = DEFAULT_TIMEOUT_S) -> List[Dict]:
+    """
+    Turns the payload `commands` into DAG jobs.
+    Plain strings become jobs named after the tool they run; objects may declare
+    `name`, `run`, `needs` and `timeout_s` explicitly.
+    """
+    jobs = []
+    for i, command in enumerate(commands):
+        if isinstance(command, str):
+            command = {"run": command}
+        name = command.get("name")
+        if not name:
+            name = next((job for key, job in KNOWN_JOBS.items() if key in command["run"]), f"cmd-{i}")
+            if any(job["name"] == name for job in jobs):
+                name = f"{name}-{i}"
+        jobs.append({
+            "name": name,
+            "run": command["run"],
+            "needs": list(command.get("needs", KNOWN_NEEDS.get(name, []))),
+            "timeout_s": command.get("timeout_s", default_timeout_s),
+        })
+
+    names = {job["name"] for job in jobs}
+    for job in jobs:
+        # Drop dependencies on jobs that are not part of this payload.
+        job["needs"] = [need for need in job["needs"] if need in names]
+    return jobs
+
+
+def _git(source: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", *args], cwd=source, capture_output=True, text=True)
+
+
+def create_worktree(source: Path) -> Path:
+    """
+    Creates a scratch copy of the repository as it is on disk, uncommitted edits included, so
+    changes validated against the working tree apply the same way here: a detached git worktree
+    of `git stash create` (HEAD when clean) plus the untracked files if possible, otherwise a plain copy.
+    """
+    worktree = Path(tempfile.mkdtemp(prefix="vibe-worktree-"))
+    snapshot = _git(source, "stash", "create")
+    revision = snapshot.stdout.strip() if snapshot.returncode == 0 and snapshot.stdout.strip() else "HEAD"
+    result = _git(source, "worktree", "add", "--detach", str(worktree), revision)
+    if result.returncode != 0:
+        shutil.rmtree(worktree)
+        shutil.copytree(source, worktree, ignore=shutil.ignore_patterns(".git", "artifacts", ".venv", "__pycache__"))
+        return worktree
+    untracked = _git(source, "ls-files", "--others", "--exclude-standard", "-z").stdout
+    for name in filter(None, untracked.split("\0")):
+        target = worktree / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source / name, target)
+    return worktree
+
+
+def remove_worktree(source: Path, worktree: Path):
+    """Removes a scratch worktree created by `create_worktree`."""
+    subprocess.run(["git", "worktree", "remove", "--force", str(worktree)], cwd=source, capture_output=True)
+    shutil.rmtree(worktree, ignore_errors=True)
+
+
+def status_file(artifacts_dir: Optional[str] = None) -> Path:
+    """Status file of the run writing to `artifacts_dir` (the shared default without one)."""
+    return Path(artifacts_dir) / "exec" / "status.json" if artifacts_dir else STATUS_FILE
+
+
+def write_status(status: Dict, path: Path = STATUS_FILE):
+    """Atomically publishes the run status so readers never see a half-written file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(status, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _run_job(job: Dict, cwd: Path, log_dir: Path = LOG_DIR) -> Dict:
+    """Runs one job, streaming its output with a `[name]` prefix and enforcing its timeout."""
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / f"{job['name']}.log"
+    start_time = time.time()
+    proc = subprocess.Popen(
+        job["run"], shell=True, cwd=cwd, text=True,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        start_new_session=True
+    )
+
+    def stream_output():
+        with open(log_path, "w", encoding="utf-8") as log:
+            for line in proc.stdout:
+                log.write(line)
+                print(f"[{job['name']}] {line}", end="")
+
+    reader = threading.Thread(target=stream_output, daemon=True)
+    reader.start()
+    try:
+        returncode = proc.wait(timeout=job["timeout_s"])
+        status = "passed" if returncode == 0 else "failed"
+    except subprocess.TimeoutExpired:
+        # Kill the whole process group so children of the shell don't keep running.
+        if hasattr(os, "killpg"):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+        returncode = proc.wait()
+        status = "timeout"
+    reader.join(timeout=5)
+
+    return {
+        "status": status,
+        "returncode": returncode,
+        "duration_s": round(time.time() - start_time, 2),
+        "log": str(log_path),
+    }
+
+
+def run_dag(jobs: List[Dict], cwd: Path, status: Dict, max_workers: Optional[int] = None,
+            status_path: Path = STATUS_FILE, log_dir: Path = LOG_DIR) -> Dict:
+    """
+    Runs jobs concurrently as soon as all of their dependencies have passed.
+    Jobs whose dependencies failed are marked as skipped. Returns the per-job results.
+    """
+    results = {job["name"]: {"status": "pending"} for job in jobs}
+    status["jobs"] = results
+    pending = {job["name"]: job for job in jobs}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(jobs) or 1) as pool:
+        while pending or running:
+            for name, job in list(pending.items()):
+                needs = [results[need]["status"] for need in job["needs"]]
+                if any(s in ("failed", "timeout", "skipped") for s in needs):
+                    results[name] = {"status": "skipped"}
+                    del pending[name]
+                elif all(s == "passed" for s in needs):
+                    print(f"▶️  Starting job '{name}': {job['run']}")
+                    results[name] = {"status": "running"}
+                    running[pool.submit(_run_job, job, cwd, log_dir)] = name
+                    del pending[name]
+            write_status(status, status_path)
+
+            if not running:
+                # Nothing can make progress any more (dependency cycle): skip what is left.
+                for name in pending:
+                    results[name] = {"status": "skipped"}
+                pending.clear()
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result()
+                icon = "✅" if results[name]["status"] == "passed" else "❌"
+                print(f"{icon} Job '{name}' {results[name]['status']} in {results[name]['duration_s']}s")
+
+    return results
+
+
+def run_local(payload: Dict, timeout_s: int = DEFAULT_TIMEOUT_S, keep_worktree: bool = False) -> Dict:
+    """
+    Local alternative to the Cursor handoff: applies `changes` to a scratch worktree,
+    runs the payload commands as a DAG and copies the produced artifacts back.
+    The final status (written to `<artifacts_dir>/exec/status.json`) tells the gate whether artifacts are ready.
+    """
+    source = Path.cwd()
+    artifacts_dir = payload.get("artifacts_dir")
+    status_path = status_file(artifacts_dir)
+    log_dir = Path(artifacts_dir) / "exec" / "logs" if artifacts_dir else LOG_DIR
+    status = {
+        "job_id": payload["branch"],
+        "state": "running",
+        "started_at": datetime.utcnow().isoformat(),
+        "artifacts_ready": False,
+        "jobs": {},
+    }
+    write_status(status, status_path)
+
+    worktree = None
+    try:
+        worktree = create_worktree(source)
+        apply_changes(payload.get("changes", []), worktree)
+        jobs = plan_jobs(payload.get("commands", []), timeout_s)
+        results = run_dag(jobs, worktree, status, status_path=status_path, log_dir=log_dir)
+
+        # Bring artifacts produced inside the worktree back to the project (atomically, deduplicated).
+        produced = worktree / "artifacts"
+        if produced.exists():
+            artifact_store.import_tree(produced, source / "artifacts")
+        status["state"] = "done"
+        status["artifacts_ready"] = True
+        status["passed"] = all(r["status"] == "passed" for r in results.values())
+    except Exception as e:
+        # Publish the failure so the gate stops waiting on this run instead of polling until it times out.
+        print(f"❌ Local run failed: {e}")
+        status["state"] = "error"
+        status["error"] = f"{type(e).__name__}: {e}"
+        status["passed"] = False
+    finally:
+        if worktree is not None and not keep_worktree:
+            remove_worktree(source, worktree)
+
+    status["finished_at"] = datetime.utcnow().isoformat()
+    write_status(status, status_path)
+    return status
+
+
+def wait_for_artifacts(job_id: str, timeout_s: float = 0, poll_s: float = 1.0, path: Path = STATUS_FILE) -> Optional[Dict]:
+    """
+    Waits until the local runner has published a finished status ("done" or "error") for `job_id`.
+    Returns the status dict, or None if no local run for this job finished in time.
+    """
+    deadline = time.time() + timeout_s
+    while True:
+        try:
+            status = json.loads(path.read_text(encoding="utf-8"))
+            if status.get("job_id") == job_id and status.get("state") in ("done", "error"):
+                return status
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        if time.time() >= deadline:
+            return None
+        time.sleep(poll_s)
@@ -0,0 +1,187 @@
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(ValueError):
+    """Raised when one or more changes cannot be applied cleanly to the target files."""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("\n".join(problems))
+
+
+def apply_search_replace(text: str, hunks: List[Dict]) -> str:
+    """Applies search/replace hunks in order. Every `search` block must match exactly once."""
+    for i, hunk in enumerate(hunks):
+        count = text.count(hunk["search"]) if hunk["search"] else 0
+        if count != 1:
+            found = "not found" if count == 0 else f"found {count} times"
+            raise PatchError([f"hunk {i}: search block {found}"])
+        text = text.replace(hunk["search"], hunk["replace"], 1)
+    return text
+
+
+def parse_unified_diff(diff: str) -> List[Dict]:
+    """Parses a unified diff into hunks with their start line and old/new lines. File headers are ignored."""
+    hunks = []
+    current = None
+    # Lines the current hunk's header still promises on each side. While either is left,
+    # `--- `/`+++ ` lines are removed/added content (a SQL comment, a Markdown rule), not file headers.
+    old_left = new_left = 0
+    # Split on newlines only: str.splitlines() also breaks on form feeds and other separators.
+    lines = diff.split("\n")
+    if diff.endswith("\n"):
+        lines.pop()
+    for line in lines:
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = {"start": int(header.group(1)), "old": [], "new": [], "added": 0, "removed": 0}
+            hunks.append(current)
+            old_left = int(header.group(2)) if header.group(2) is not None else 1
+            new_left = int(header.group(4)) if header.group(4) is not None else 1
+        elif current is None or line.startswith("\\"):
+            continue
+        elif old_left <= 0 and new_left <= 0 and line.startswith(("--- ", "+++ ")):
+            continue
+        elif line.startswith("-"):
+            current["old"].append(line[1:])
+            current["removed"] += 1
+            old_left -= 1
+        elif line.startswith("+"):
+            current["new"].append(line[1:])
+            current["added"] += 1
+            new_left -= 1
+        elif line.startswith(" ") or line in ("", "\r"):
+            # Context line; some tools strip the leading space from blank lines.
+            current["old"].append(line[1:] if line.startswith(" ") else line)
+            current["new"].append(line[1:] if line.startswith(" ") else line)
+            old_left -= 1
+            new_left -= 1
+        else:
+            raise PatchError([f"hunk {len(hunks) - 1}: line {line!r} has no ' ', '+' or '-' prefix"])
+    if not hunks:
+        raise PatchError(["diff contains no @@ hunks"])
+    return hunks
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """
+    Applies a unified diff to `text`. Each hunk is matched at its stated line first and
+    then at the nearest offset, like `patch` does; context must match exactly.
+    """
+    lines = text.split("\n")
+    if text.endswith("\n") or not text:
+        lines.pop()
+    offset = 0
+    for i, hunk in enumerate(parse_unified_diff(diff)):
+        old, new = hunk["old"], hunk["new"]
+        expected = max(hunk["start"] - 1 + offset, 0)
+        candidates = sorted(range(len(lines) - len(old) + 1), key=lambda pos: abs(pos - expected))
+        position = next((pos for pos in candidates if lines[pos:pos + len(old)] == old), None)
+        if position is None:
+            raise PatchError([f"hunk {i} (line {hunk['start']}): context does not match the target file"])
+        lines[position:position + len(old)] = new
+        offset += len(new) - len(old)
+
+    patched = "\n".join(lines)
+    if text.endswith("\n") or not text:
+        patched += "\n"
+    return patched
+
+
+def patch_content(original: str, change: Dict) -> str:
+    """Returns the new content of a file after applying a `patch` change."""
+    if change.get("hunks"):
+        return apply_search_replace(original, change["hunks"])
+    if change.get("diff"):
+        return apply_unified_diff(original, change["diff"])
+    raise PatchError(["patch change has neither 'hunks' nor 'diff'"])
+
+
+def resolve_changes(changes: List[Dict], root: Path) -> Dict[Path, Optional[str]]:
+    """
+    Validates every change against the files under `root` and computes the final
+    content per file (None means delete) without touching the disk.
+    Raises PatchError listing every change that cannot be applied.
+    """
+    resolved: Dict[Path, Optional[str]] = {}
+    problems = []
+    for change in changes:
+        target = root / change["file"]
+        try:
+            if change["action"] == "delete":
+                resolved[target] = None
+            elif change["action"] == "patch":
+                if target in resolved:
+                    original = resolved[target]
+                elif target.exists():
+                    original = target.read_text(encoding="utf-8")
+                else:
+                    original = None
+                if original is None:
+                    raise PatchError(["target file does not exist"])
+                resolved[target] = patch_content(original, change)
+            else:
+                resolved[target] = change.get("content", "")
+        except PatchError as e:
+            problems.extend(f"{change['file']}: {problem}" for problem in e.problems)
+    if problems:
+        raise PatchError(problems)
+    return resolved
+
+
+def apply_changes(changes: List[Dict], root: Path):
+    """
+    Applies the structured `changes` list to the files under `root` atomically:
+    all changes are validated first, each file is written to a temp file and renamed
+    into place, and already-replaced files are restored if a later write fails.
+    """
+    resolved = resolve_changes(changes, root)
+    backups: Dict[Path, Optional[bytes]] = {}
+    try:
+        for target, content in resolved.items():
+            backups[target] = target.read_bytes() if target.exists() else None
+            if content is None:
+                if target.exists():
+                    target.unlink()
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                    f.write(content)
+                os.replace(tmp_path, target)
+            finally:
+                # Only left behind if the write or rename failed.
+                Path(tmp_path).unlink(missing_ok=True)
+    except Exception:
+        for target, original in backups.items():
+            if original is None:
+                target.unlink(missing_ok=True)
+            else:
+                target.write_bytes(original)
+        raise
+
+
+def summarize_change(change: Dict) -> str:
+    """Short human-readable summary of a change's size, e.g. '2 hunks, +5/-3 lines'."""
+    if change.get("action") != "patch":
+        lines = len(change.get("content", "").splitlines())
+        return f"{lines} line{'s' if lines != 1 else ''}" if lines else ""
+    if change.get("hunks"):
+        hunks = change["hunks"]
+        added = sum(len(h.get("replace", "").splitlines()) for h in hunks)
+        removed = sum(len(h.get("search", "").splitlines()) for h in hunks)
+    else:
+        try:
+            hunks = parse_unified_diff(change.get("diff", ""))
+        except PatchError:
+            return "unparseable diff"
+        added = sum(h["added"] for h in hunks)
+        removed = sum(h["removed"] for h in hunks)
+    return f"{len(hunks)} hunk{'s' if len(hunks) != 1 else ''}, +{added}/-{removed} lines"
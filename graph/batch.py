@@ -0,0 +1,227 @@
+"""
+Batch mode: plans and first dev drafts of queued tasks through the providers' batch endpoints.
+
+Overnight backlogs don't need interactive latency, so `vibe batch` holds queued jobs
+(status `batched`), sends their planner prompts as one batch, then the dev prompts built
+from the returned plans, and polls until each batch has ended. Every result is recorded
+in the initial graph state of the job's thread (`batch_results`). Once its batch work is
+done a job is released to the workers; the planner and the first dev call of its run
+use the recorded results instead of calling the model. Requests that fail in a batch
+are simply made live by the worker.
+
+Settings live under `routing.batch` in the spec. VIBE_BATCH_BACKEND=local sends every
+batch to the stand-in server in benchmarks/batch_standin_server.py.
+"""
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from graph.app import build_dev_prompt, build_planner_prompt
+from graph.utils.batch_providers import ENDED, get_batch_provider
+from graph.utils.llm import provider_for
+from utils import job_queue
+from utils.observability import calculate_cost, log_metric
+
+DEFAULT_SETTINGS = {
+    "backend": "provider",
+    "local_url": "http://127.0.0.1:8765",
+    "price_factor": 0.5,
+    "max_tokens": 8192,
+    "poll_s": 60,
+    "max_jobs": 100,
+}
+TEMPERATURES = {"planner": 0.2, "dev": 0.1}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    node TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'submitted',
+    items INTEGER NOT NULL,
+    submitted_at REAL NOT NULL,
+    collected_at REAL
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL,
+    custom_id TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    node TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    PRIMARY KEY (batch_id, custom_id)
+);
+CREATE INDEX IF NOT EXISTS idx_batch_items_thread ON batch_items (thread_id, node);
+"""
+
+
+def get_batch_settings(spec: dict) -> dict:
+    """Reads `routing.batch` from the spec, filling in defaults. VIBE_BATCH_BACKEND overrides the backend."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(spec.get("routing", {}).get("batch", {}) or {})
+    settings["backend"] = os.getenv("VIBE_BATCH_BACKEND", settings["backend"])
+    return settings
+
+
+def connect(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    """Opens the job queue database with the batch-mode tables."""
+    conn = job_queue.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _batch_results(conn: sqlite3.Connection, thread_id: str) -> Dict:
+    return (job_queue.get_initial_state(conn, thread_id) or {}).get("batch_results", {})
+
+
+def _drafts_dev(job: Dict) -> bool:
+    # Best-of-N jobs generate their candidates live; only their plan is batched.
+    return (job["fanout"] or 1) <= 1
+
+
+# --- Submitting ---
+
+def _submit(conn: sqlite3.Connection, node: str, model: str, work: List[Tuple[Dict, str]], settings: dict) -> int:
+    """Sends one batch of `node` prompts [(job, prompt)]; on failure the jobs are released to the workers."""
+    requests = [
+        {"custom_id": f"{node}-{job['id']}", "model": model, "prompt": prompt,
+         "temperature": TEMPERATURES[node], "max_tokens": settings["max_tokens"]}
+        for job, prompt in work
+    ]
+    provider = provider_for(model)
+    try:
+        batch_id = get_batch_provider(provider, settings).submit(requests)
+    except Exception as e:
+        print(f"⚠️ Could not submit the {node} batch ({type(e).__name__}: {e}); {len(work)} job(s) will run live.")
+        for job, _ in work:
+            job_queue.release(conn, job["thread_id"])
+        return 0
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO batches (id, provider, node, model, items, submitted_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (batch_id, provider, node, model, len(work), time.time())
+        )
+        conn.executemany(
+            "INSERT INTO batch_items (batch_id, custom_id, thread_id, node) VALUES (?, ?, ?, ?)",
+            [(batch_id, request["custom_id"], job["thread_id"], node) for request, (job, _) in zip(requests, work)]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    print(f"📤 Submitted {node} batch {batch_id} ({len(work)} prompt(s), {model} via {settings['backend']} backend)")
+    return len(work)
+
+
+def submit(conn: sqlite3.Connection, spec: dict, settings: dict, limit: Optional[int] = None) -> int:
+    """
+    Submits dev prompts for held jobs whose plan has arrived, then planner prompts for
+    up to `limit` newly held jobs. Returns the number of prompts submitted.
+    """
+    routing = spec.get("routing", {})
+    planned = [
+        dict(row) for row in conn.execute(
+            "SELECT * FROM jobs WHERE status = 'batched' AND thread_id NOT IN "
+            "(SELECT thread_id FROM batch_items WHERE node = 'dev') ORDER BY enqueued_at, id"
+        )
+    ]
+    dev_work = []
+    for job in planned:
+        plan = _batch_results(conn, job["thread_id"]).get("planner")
+        if plan is not None and _drafts_dev(job):
+            dev_work.append((job, build_dev_prompt(job["task"], plan["content"])))
+    submitted = 0
+    if dev_work:
+        # A batched draft has no interactive cheap-first fallback, so it uses the quality model.
+        submitted += _submit(conn, "dev", routing.get("dev_llm", "claude-4-sonnet"), dev_work, settings)
+
+    held = job_queue.hold(conn, limit if limit is not None else int(settings["max_jobs"]))
+    if held:
+        plan_work = [(job, build_planner_prompt(job["task"])) for job in held]
+        submitted += _submit(conn, "planner", routing.get("planner_llm", "gpt-5"), plan_work, settings)
+    return submitted
+
+
+# --- Collecting ---
+
+def collect(conn: sqlite3.Connection, settings: dict) -> Dict[str, int]:
+    """
+    Polls every submitted batch; for each one that has ended, records its results in the
+    threads' initial state and releases the jobs that need no further batch work.
+    """
+    counts = {"done": 0, "failed": 0, "released": 0}
+    for batch in conn.execute("SELECT * FROM batches WHERE status = 'submitted' ORDER BY submitted_at").fetchall():
+        try:
+            # Inside the try: a missing SDK or API key for one provider must not stop the others.
+            provider = get_batch_provider(batch["provider"], settings)
+            if provider.status(batch["id"]) != ENDED:
+                continue
+            results = provider.results(batch["id"])
+        except Exception as e:
+            print(f"⚠️ Could not poll batch {batch['id']} ({type(e).__name__}: {e}); retrying on the next poll.")
+            continue
+
+        items = conn.execute(
+            "SELECT batch_items.*, jobs.fanout FROM batch_items JOIN jobs USING (thread_id) WHERE batch_id = ?",
+            (batch["id"],)
+        ).fetchall()
+        for item in items:
+            result = results.get(item["custom_id"]) or {"error": "missing from the batch results"}
+            batch_results = _batch_results(conn, item["thread_id"])
+            failed = bool(result.get("error")) or not result.get("content")
+            if failed:
+                print(f"⚠️ {item['node']} request for '{item['thread_id']}' failed in batch {batch['id']}: "
+                      f"{result.get('error') or 'empty response'}; the worker will call the model live.")
+            else:
+                cost = calculate_cost(batch["model"], result["input_tokens"], result["output_tokens"])
+                batch_results[item["node"]] = {
+                    "batch_id": batch["id"],
+                    "model": batch["model"],
+                    "content": result["content"],
+                    "input_tokens": result["input_tokens"],
+                    "output_tokens": result["output_tokens"],
+                    "cost_usd": cost * float(settings["price_factor"]),
+                }
+            # Recorded even when empty: a thread with initial state is never held for batching again.
+            job_queue.update_initial_state(conn, item["thread_id"], {"batch_results": batch_results})
+            conn.execute("UPDATE batch_items SET status = ? WHERE batch_id = ? AND custom_id = ?",
+                         ("failed" if failed else "done", batch["id"], item["custom_id"]))
+            counts["failed" if failed else "done"] += 1
+            if item["node"] == "dev" or failed or not _drafts_dev(item):
+                counts["released"] += job_queue.release(conn, item["thread_id"])
+
+        now = time.time()
+        conn.execute("UPDATE batches SET status = 'collected', collected_at = ? WHERE id = ?", (now, batch["id"]))
+        # Token costs are logged with each run when it uses its result, so this row only records the turnaround.
+        log_metric("batch", f"{batch['node']}_collected", (now - batch["submitted_at"]) * 1000, model=batch["model"])
+        print(f"📥 Collected {batch['node']} batch {batch['id']} after {(now - batch['submitted_at']) / 60:.1f} min")
+    return counts
+
+
+def pending_batches(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COUNT(*) AS n FROM batches WHERE status = 'submitted'").fetchone()["n"]
+
+
+def run(conn: sqlite3.Connection, spec: dict, limit: Optional[int] = None, wait: bool = False,
+        poll_s: Optional[float] = None) -> Dict[str, int]:
+    """
+    One batch-mode pass: collects ended batches and submits new ones. With `wait`, keeps
+    polling until every batch has been collected and its jobs released to the workers.
+    """
+    settings = get_batch_settings(spec)
+    poll_s = float(poll_s if poll_s is not None else settings["poll_s"])
+    totals = {"submitted": 0, "done": 0, "failed": 0, "released": 0}
+    while True:
+        for key, value in collect(conn, settings).items():
+            totals[key] += value
+        totals["submitted"] += submit(conn, spec, settings, limit)
+        # Only the first pass takes new jobs, so a long wait doesn't keep pulling in the backlog.
+        limit = 0
+        totals["pending_batches"] = pending_batches(conn)
+        if not wait or not totals["pending_batches"]:
+            return totals
+        time.sleep(poll_s)
@@ -0,0 +1,172 @@
+"""
+Asynchronous batch endpoints of the LLM providers, behind one small interface.
+
+A batch is a list of requests {"custom_id", "model", "prompt", "temperature", "max_tokens"}.
+`submit()` returns a batch id, `status()` reports "in_progress" or "ended", and `results()`
+maps each custom_id to {"content", "input_tokens", "output_tokens", "error"}; requests
+missing from the results count as failed. `LocalBatchProvider` speaks the same protocol
+to a stand-in server (benchmarks/batch_standin_server.py), so the whole batch flow can
+be exercised without network. Provider SDKs are imported only when a batch is sent.
+"""
+import json
+import urllib.request
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+IN_PROGRESS, ENDED = "in_progress", "ended"
+
+
+def _result(content=None, input_tokens=0, output_tokens=0, error=None) -> Dict:
+    return {"content": content, "input_tokens": input_tokens, "output_tokens": output_tokens, "error": error}
+
+
+class BatchProvider(ABC):
+    """Interface of a provider batch endpoint."""
+
+    name = "base"
+
+    @abstractmethod
+    def submit(self, requests: List[Dict]) -> str:
+        """Sends `requests` as one batch and returns its id."""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """IN_PROGRESS or ENDED."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> Dict[str, Dict]:
+        """Maps each custom_id of an ended batch to its result."""
+
+
+class AnthropicBatchProvider(BatchProvider):
+    """Anthropic Message Batches API."""
+
+    name = "anthropic"
+
+    def __init__(self):
+        import anthropic
+        self.client = anthropic.Anthropic()
+
+    def submit(self, requests: List[Dict]) -> str:
+        batch = self.client.messages.batches.create(requests=[
+            {
+                "custom_id": r["custom_id"],
+                "params": {
+                    "model": r["model"],
+                    "max_tokens": r["max_tokens"],
+                    "temperature": r["temperature"],
+                    "messages": [{"role": "user", "content": r["prompt"]}],
+                },
+            }
+            for r in requests
+        ])
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        return ENDED if batch.processing_status == "ended" else IN_PROGRESS
+
+    def results(self, batch_id: str) -> Dict[str, Dict]:
+        results = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type != "succeeded":
+                results[entry.custom_id] = _result(error=f"request {entry.result.type}")
+                continue
+            message = entry.result.message
+            text = "".join(block.text for block in message.content if block.type == "text")
+            results[entry.custom_id] = _result(text, message.usage.input_tokens, message.usage.output_tokens)
+        return results
+
+
+class OpenAIBatchProvider(BatchProvider):
+    """OpenAI Batch API over /v1/chat/completions (24h completion window)."""
+
+    name = "openai"
+
+    def __init__(self):
+        from openai import OpenAI
+        self.client = OpenAI()
+
+    def submit(self, requests: List[Dict]) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": r["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": r["model"],
+                    "temperature": r["temperature"],
+                    "max_completion_tokens": r["max_tokens"],
+                    "messages": [{"role": "user", "content": r["prompt"]}],
+                },
+            }, ensure_ascii=False)
+            for r in requests
+        ]
+        upload = self.client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+        batch = self.client.batches.create(input_file_id=upload.id, endpoint="/v1/chat/completions",
+                                           completion_window="24h")
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        batch = self.client.batches.retrieve(batch_id)
+        return ENDED if batch.status in ("completed", "failed", "expired", "cancelled") else IN_PROGRESS
+
+    def results(self, batch_id: str) -> Dict[str, Dict]:
+        batch = self.client.batches.retrieve(batch_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                if entry.get("error") or response.get("status_code") != 200:
+                    error = entry.get("error") or response.get("body", {}).get("error")
+                    results[entry["custom_id"]] = _result(error=f"request failed: {error}")
+                    continue
+                body = response["body"]
+                usage = body.get("usage", {})
+                results[entry["custom_id"]] = _result(body["choices"][0]["message"]["content"],
+                                                      usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        return results
+
+
+class LocalBatchProvider(BatchProvider):
+    """
+    JSON-over-HTTP stand-in: POST {url}/batches {"requests": [...]} -> {"id"},
+    GET {url}/batches/<id> -> {"status"}, GET {url}/batches/<id>/results -> {"results"}.
+    """
+
+    name = "local"
+
+    def __init__(self, url: str, timeout_s: float = 30):
+        self.url = url.rstrip("/")
+        self.timeout_s = timeout_s
+
+    def _call(self, path: str, body: Dict = None) -> Dict:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(f"{self.url}{path}", data=data, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout_s) as response:
+            return json.loads(response.read())
+
+    def submit(self, requests: List[Dict]) -> str:
+        return self._call("/batches", {"requests": requests})["id"]
+
+    def status(self, batch_id: str) -> str:
+        return self._call(f"/batches/{batch_id}")["status"]
+
+    def results(self, batch_id: str) -> Dict[str, Dict]:
+        return {custom_id: _result(**result) for custom_id, result in self._call(f"/batches/{batch_id}/results")["results"].items()}
+
+
+def get_batch_provider(provider: str, settings: Dict) -> BatchProvider:
+    """The batch endpoint for `provider` ("openai" or "anthropic"), or the stand-in with backend "local"."""
+    if settings["backend"] == "local":
+        return LocalBatchProvider(settings["local_url"])
+    if provider == "anthropic":
+        return AnthropicBatchProvider()
+    if provider == "openai":
+        return OpenAIBatchProvider()
+    raise ValueError(f"Unknown batch provider: {provider}")
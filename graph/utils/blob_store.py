@@ -0,0 +1,177 @@
+"""
+Content-addressed blob store for large graph state fields.
+
+Large values (plans, change lists, backtest reports, raw LLM errors) are written once to
+`artifacts/blobs/objects/` under their SHA-256 and the state only carries a small
+`{"$blob": <sha256>, "bytes": <size>}` reference. Each thread records which blobs its
+current state points at, so blobs no longer referenced by any thread can be collected.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache, wraps
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+BLOB_DIR = Path("artifacts/blobs")
+OBJECTS_DIR = BLOB_DIR / "objects"
+REFS_DIR = BLOB_DIR / "refs"
+
+# Values whose JSON encoding is smaller than this stay inline in the state.
+INLINE_LIMIT_BYTES = 2048
+# State fields that are moved out of band when they grow large.
+LARGE_FIELDS = ("plan", "code_diff", "backtest_report", "error", "correction_suggestion", "batch_results")
+# Blobs younger than this are never collected, so a writer that has not yet recorded its ref is safe.
+GC_GRACE_SECONDS = 3600
+
+_refs_lock = threading.Lock()
+
+
+def is_ref(value: Any) -> bool:
+    """True if `value` is a blob reference rather than an inline value."""
+    return isinstance(value, dict) and "$blob" in value
+
+
+def _object_path(digest: str) -> Path:
+    return OBJECTS_DIR / digest[:2] / digest
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def put(value: Any) -> Dict[str, Any]:
+    """Stores `value` (any JSON-serializable object) once and returns its reference."""
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    digest = sha256(data).hexdigest()
+    path = _object_path(digest)
+    if path.exists():
+        # Refresh the mtime so a concurrent collect_garbage() keeps it within the grace period.
+        os.utime(path)
+    else:
+        _write_atomic(path, data)
+    return {"$blob": digest, "bytes": len(data)}
+
+
+@lru_cache(maxsize=256)
+def _read(digest: str) -> bytes:
+    # Blobs are immutable, so caching by digest is always safe.
+    return _object_path(digest).read_bytes()
+
+
+def _load(digest: str) -> Any:
+    # Parsed on every load, so a caller that mutates the value cannot corrupt later loads.
+    return json.loads(_read(digest))
+
+
+def resolve(value: Any) -> Any:
+    """Returns the stored value for a blob reference, or `value` itself if it is inline."""
+    return _load(value["$blob"]) if is_ref(value) else value
+
+
+def load(state: Dict, key: str, default: Any = None) -> Any:
+    """Lazily reads a state field, fetching it from the blob store only when it is a reference."""
+    return resolve(state.get(key, default))
+
+
+def offload(value: Any, thread_id: str, slot: str) -> Any:
+    """
+    Moves `value` into the blob store if it is large and records it as the
+    current content of `slot` for `thread_id`. Small values are returned unchanged.
+    """
+    if is_ref(value):
+        ref = value
+    else:
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if size < INLINE_LIMIT_BYTES:
+            _set_ref(thread_id, slot, None)
+            return value
+        ref = put(value)
+    _set_ref(thread_id, slot, ref["$blob"])
+    return ref
+
+
+def offload_state(state: Dict, thread_id: str = None) -> Dict:
+    """Offloads every large field of a graph state (or partial update) in place and returns it."""
+    thread_id = thread_id or state.get("thread_id", "default")
+    for key in LARGE_FIELDS:
+        if key in state:
+            state[key] = offload(state[key], thread_id, key)
+    return state
+
+
+def offloads_large_fields(node):
+    """Node decorator: moves large fields of whatever the node returns into the blob store."""
+    @wraps(node)
+    def wrapper(state, *args, **kwargs):
+        return offload_state(node(state, *args, **kwargs), state.get("thread_id", "default"))
+    return wrapper
+
+
+def _set_ref(thread_id: str, slot: str, digest):
+    """Records (or clears) which blob a thread's `slot` currently points at."""
+    path = REFS_DIR / f"{thread_id}.json"
+    with _refs_lock:
+        refs = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        if refs.get(slot) == digest:
+            return
+        if digest is None:
+            refs.pop(slot, None)
+        else:
+            refs[slot] = digest
+        _write_atomic(path, json.dumps(refs, indent=2).encode("utf-8"))
+
+
+def release_thread(thread_id: str):
+    """Drops all references held by a thread; its blobs become collectable."""
+    (REFS_DIR / f"{thread_id}.json").unlink(missing_ok=True)
+
+
+def release_idle_threads(max_age_days: float) -> int:
+    """Releases every thread whose references haven't changed for `max_age_days`. Returns how many."""
+    cutoff = time.time() - max_age_days * 86_400
+    released = 0
+    for ref_file in REFS_DIR.glob("*.json"):
+        try:
+            if ref_file.stat().st_mtime < cutoff:
+                ref_file.unlink()
+                released += 1
+        except FileNotFoundError:
+            continue
+    return released
+
+
+def collect_garbage(grace_seconds: float = GC_GRACE_SECONDS, max_age_days: Optional[float] = None) -> int:
+    """
+    Deletes blobs that no thread references any more. With `max_age_days`, threads idle for that
+    long are released first, so finished threads stop pinning their final state's blobs.
+    Returns the number of blobs removed.
+    """
+    if max_age_days is not None:
+        release_idle_threads(max_age_days)
+    if not OBJECTS_DIR.exists():
+        return 0
+    live = set()
+    for ref_file in REFS_DIR.glob("*.json"):
+        try:
+            live.update(json.loads(ref_file.read_text(encoding="utf-8")).values())
+        except (OSError, json.JSONDecodeError):
+            # A refs file we cannot read might be mid-write: don't risk collecting anything.
+            return 0
+
+    removed = 0
+    cutoff = time.time() - grace_seconds
+    for path in OBJECTS_DIR.glob("*/*"):
+        if path.name.startswith(".tmp-") or path.name in live:
+            continue
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
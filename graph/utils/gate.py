@@ -0,0 +1,179 @@
+"""
+Shared acceptance-gate logic for the VibeCoder graph.
+
+`gate_node`, the best-of-N candidate evaluator and scripts/run_gate.py all compare
+a backtest report against the `acceptance.backtest` criteria from the project spec.
+"""
+import operator
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils import artifact_store
+from utils.early_stopping import get_early_stop_settings
+from utils.resampling import get_confidence_settings, intervals_for_report
+
+# Legacy acceptance keys and the report metric they refer to. Any other key is taken
+# to be a metric name itself, e.g. `sharpe: ">=1.5"` or `max_drawdown: "<=0.1"`.
+METRIC_ALIASES = {
+    "sample_out_winrate": "winrate",
+    "mfe_target": "mfe",
+    "mae_limit": "mae",
+}
+
+OPERATORS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+}
+
+_CRITERION = re.compile(r"^\s*(>=|<=|==|>|<)?\s*(-?[0-9.]+(?:e-?[0-9]+)?)\s*$")
+
+# Correction hints for the classic metrics, keyed by metric and by whether the criterion is a
+# lower (">") or upper ("<") bound; other combinations get a generic message.
+_HINTS = {
+    ("winrate", ">"): lambda v, t: f"- Winrate is {v:.2%}, which is below the required {t:.2%}. The strategy's entry/exit logic needs improvement.",
+    ("mfe", ">"): lambda v, t: f"- MFE (Max Favorable Excursion) is {v:.3%}, below the target {t:.3%}. The strategy may be closing winning trades too early.",
+    ("mae", "<"): lambda v, t: f"- MAE (Max Adverse Excursion) is {v:.3%}, exceeding the limit of {t:.3%}. The stop-loss mechanism is not tight enough.",
+    ("trades_per_day", "<"): lambda v, t: f"- Average trades per day is {v}, which is over the limit of {t}. The entry signal is too sensitive.",
+    ("trades_per_day", ">"): lambda v, t: f"- Average trades per day is {v}, which is below the required {t}. The entry conditions are too strict to trade often enough.",
+    ("max_drawdown", "<"): lambda v, t: f"- Max drawdown is {v:.2%}, exceeding the limit of {t:.2%}. Position sizing or exits need to cut losing streaks sooner.",
+}
+
+
+def parse_criterion(expression) -> Tuple[str, float]:
+    """Parses ">=0.7" (or a bare number, meaning >=) into (operator, threshold)."""
+    match = _CRITERION.match(str(expression))
+    if not match:
+        raise ValueError(f"Invalid acceptance criterion: {expression!r}")
+    return match.group(1) or ">=", float(match.group(2))
+
+
+def compile_criteria(criteria: Dict) -> List[Dict]:
+    """Parses `acceptance.backtest` once into [{"key", "metric", "op", "threshold"}]."""
+    compiled = []
+    for key, expression in criteria.items():
+        op, threshold = parse_criterion(expression)
+        compiled.append({"key": key, "metric": METRIC_ALIASES.get(key, key), "op": op, "threshold": threshold})
+    return compiled
+
+
+def early_stop_kwargs(spec: dict) -> Dict:
+    """`run_backtest` arguments for early stopping, or {} unless `acceptance.early_stop.enabled`."""
+    settings = get_early_stop_settings(spec)
+    if not settings["enabled"]:
+        return {}
+    return {"criteria": compile_criteria(spec.get("acceptance", {}).get("backtest", {})), "early_stop": settings}
+
+
+_FORMATS = {
+    "winrate": "{:.2%}",
+    "mfe": "{:.3%}",
+    "mae": "{:.3%}",
+    "trades_per_day": "{:.2f}",
+}
+
+
+def _compared_value(value, interval: Optional[Dict], op: str, bound: str):
+    """
+    Picks what a criterion is compared with. "conservative" requires the unfavourable end
+    of the interval to meet the threshold (lower bound for >=, upper bound for <=);
+    "lenient" only fails when even the favourable end misses; "point" uses the estimate.
+    """
+    if interval is None or bound == "point" or op == "==":
+        return value
+    lower_is_worse = op in (">=", ">")
+    if bound == "conservative":
+        return interval["low"] if lower_is_worse else interval["high"]
+    if bound == "lenient":
+        return interval["high"] if lower_is_worse else interval["low"]
+    raise ValueError(f"Unknown confidence bound: {bound!r} (expected conservative, lenient or point)")
+
+
+def format_interval(metric: str, interval: Dict, level: float) -> str:
+    fmt = _FORMATS.get(metric, "{:.4g}")
+    return f"{level:.0%} CI {fmt.format(interval['low'])} to {fmt.format(interval['high'])}"
+
+
+def check_criteria(results: Dict, criteria: Dict, intervals: Optional[Dict] = None, bound: str = "point") -> List[Dict]:
+    """
+    Evaluates every acceptance criterion against the backtest report.
+    Returns one dict per criterion: key, metric, op, threshold, value, interval, compared and ok.
+    With bootstrap `intervals`, metrics that have one are compared at the `bound` end.
+    A metric missing from the report (or undefined, None) fails its criterion.
+    """
+    checks = []
+    for criterion in compile_criteria(criteria):
+        key, metric, op, threshold = criterion["key"], criterion["metric"], criterion["op"], criterion["threshold"]
+        value = results.get(metric)
+        interval = (intervals or {}).get(metric)
+        compared = _compared_value(value, interval, op, bound) if value is not None else None
+        ok = compared is not None and OPERATORS[op](compared, threshold)
+        checks.append({"key": key, "metric": metric, "op": op, "threshold": threshold, "value": value,
+                       "interval": interval, "compared": compared, "ok": ok})
+    return checks
+
+
+def evaluate_backtest(results: Dict, criteria: Dict, intervals: Optional[Dict] = None,
+                      bound: str = "point", level: float = 0.95) -> Tuple[bool, List[str]]:
+    """
+    Compares backtest results against acceptance criteria.
+    Returns (passed, suggestions) where suggestions are correction hints for the dev node.
+    """
+    suggestions = []
+    early_stop = results.get("early_stop") if results.get("early_stopped") else None
+    if early_stop:
+        # A partial report never passes, even if its metrics (or their wide intervals) happen to.
+        suggestions.append(f"- The backtest stopped early after {early_stop['trades']} of {early_stop.get('planned_trades') or 'the planned'} trades "
+                           f"because `{early_stop['key']}: {early_stop['op']}{early_stop['threshold']}` cannot be met: {early_stop['reason']}.")
+    checks = check_criteria(results, criteria, intervals, bound)
+    for check in checks:
+        if check["ok"]:
+            continue
+        metric, value, threshold = check["metric"], check["value"], check["threshold"]
+        if value is None:
+            suggestions.append(f"- Metric '{metric}' is missing or undefined in the backtest report, so `{check['key']}: {check['op']}{threshold}` cannot be met.")
+            continue
+        interval = check["interval"]
+        if interval is not None and OPERATORS[check["op"]](value, threshold):
+            # The estimate passes, but with these few trades it could be luck.
+            fmt = _FORMATS.get(metric, "{:.4g}")
+            hint = (f"- {metric} is {fmt.format(value)}, but the {bound} end of its {format_interval(metric, interval, level)} "
+                    f"does not satisfy {check['op']}{threshold}. The result is not distinguishable from noise; the edge needs to be stronger or more consistent.")
+        else:
+            hint_key = (metric, check["op"][0])
+            hint = _HINTS[hint_key](value, threshold) if hint_key in _HINTS else f"- {metric} is {value}, which does not satisfy {check['op']}{threshold}."
+            if interval is not None:
+                hint += f" ({format_interval(metric, interval, level)}.)"
+        suggestions.append(hint)
+
+    return not early_stop and all(check["ok"] for check in checks), suggestions
+
+
+def evaluate_report(results: Dict, report_path: Path, acceptance: Dict) -> Tuple[bool, List[str]]:
+    """
+    Gates a backtest report against the `acceptance` section of the spec, using bootstrap
+    intervals from the trade log next to the report when `acceptance.confidence` allows.
+    The intervals are added to `results` and to the report file under "confidence_intervals".
+    """
+    settings = get_confidence_settings({"acceptance": acceptance})
+    intervals = intervals_for_report(report_path, settings)
+    if intervals:
+        results["confidence_intervals"] = intervals
+        artifact_store.write_json(report_path, results)
+    return evaluate_backtest(results, acceptance.get("backtest", {}), intervals, settings["bound"], float(settings["level"]))
+
+
+def rank_key(passed: bool, results: Dict) -> Tuple:
+    """
+    Sort key for choosing between gated candidates (higher is better).
+    Passing candidates always beat failing ones; ties are broken by winrate, MFE and then lower MAE.
+    """
+    return (
+        passed,
+        results.get("winrate", 0.0),
+        results.get("mfe", 0.0),
+        -results.get("mae", 0.0),
+    )
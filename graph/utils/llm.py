@@ -0,0 +1,38 @@
+"""
+Chat model construction for the graph nodes.
+
+Provider SDKs (langchain_openai, langchain_anthropic and their openai/anthropic
+clients) are imported only when a node actually builds a model, so importing
+graph.app or running lightweight CLI commands doesn't pay for them.
+"""
+from typing import Callable, Optional
+
+# Optional override used by offline benchmarks to swap in stub chat models.
+_factory_override: Optional[Callable] = None
+
+
+def set_chat_model_factory(factory: Optional[Callable]):
+    """
+    Routes every get_chat_model() call to `factory(provider, model, temperature)`.
+    Pass None to restore the real provider SDKs.
+    """
+    global _factory_override
+    _factory_override = factory
+
+
+def get_chat_model(provider: str, model: str, temperature: float):
+    """Returns a LangChain chat model for `provider` ("openai" or "anthropic")."""
+    if _factory_override is not None:
+        return _factory_override(provider, model, temperature)
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=model, temperature=temperature)
+    if provider == "anthropic":
+        from langchain_anthropic import ChatAnthropic
+        return ChatAnthropic(model=model, temperature=temperature)
+    raise ValueError(f"Unknown chat model provider: {provider}")
+
+
+def provider_for(model: str) -> str:
+    """The provider serving `model`, for routers that may pick models across providers."""
+    return "anthropic" if "claude" in model.lower() else "openai"
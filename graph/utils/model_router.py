@@ -0,0 +1,250 @@
+"""
+Adaptive model routing learned from the observability log.
+
+For each node (planner, dev) and task type, every candidate model is an arm of a
+contextual bandit. Past runs give each arm a gate-pass record, a mean cost and a mean
+latency:
+- a dev call passes if the gate of the same run and iteration passed;
+- a cheap attempt that triggered the fallback counts as a failure;
+- a planner call passes if its run eventually passed the gate.
+
+Pass rates are Thompson-sampled from a Beta posterior.
+- Under `cost_policy.prefer: cheap-first` the router picks the arm with the lowest
+  cost × latency whose sampled pass rate clears `min_pass_rate`.
+- Under `best-quality` it picks the highest sampled pass rate.
+
+Arms with fewer than `min_samples` outcomes are explored first, cheapest first under
+cheap-first. Each decision is printed and appended, with every arm's numbers, to
+`artifacts/logs/router_decisions.jsonl`.
+"""
+import json
+import random
+import re
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.observability import LOG_FILE, current_run_context, log_metric, resolve_model_costs
+
+DECISIONS_FILE = LOG_FILE.parent / "router_decisions.jsonl"
+DEFAULT_CHEAP_LLM = "claude-3-haiku-20240307"
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "min_pass_rate": 0.6,
+    "min_samples": 3,
+    "window_days": 30,
+    "candidates": {},
+    "task_types": {
+        "indicator": ["indicator", "rsi", "macd", "ema", "sma", "atr", "bollinger", "vwap", "fvg"],
+        "risk": ["risk", "stop", "position size", "sizing", "drawdown", "hedge"],
+        "refactor": ["refactor", "rename", "clean up", "cleanup", "restructure"],
+        "bugfix": ["fix", "bug", "error", "crash", "regression"],
+    },
+}
+LEARNED_NODES = ("planner", "dev", "dev_cheap_attempt", "gate")
+ALL_TYPES = "*"
+
+
+def get_router_settings(spec: dict) -> dict:
+    """Reads `routing.adaptive` from the spec, filling in defaults."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(spec.get("routing", {}).get("adaptive", {}) or {})
+    return settings
+
+
+def candidates_for(node: str, spec: dict, settings: dict) -> List[str]:
+    """Models the router may pick for `node`; defaults to the spec's static models."""
+    routing = spec.get("routing", {})
+    configured = (settings.get("candidates") or {}).get(node)
+    if configured:
+        return list(configured)
+    if node == "planner":
+        return [routing.get("planner_llm", "gpt-5")]
+    return list(dict.fromkeys([routing.get("cheap_llm", DEFAULT_CHEAP_LLM), routing.get("dev_llm", "claude-4-sonnet")]))
+
+
+def classify_task(task: str, task_types: Dict[str, List[str]]) -> str:
+    """The first task type with a keyword in `task` (whole words), or "general"."""
+    text = (task or "").lower()
+    for task_type, keywords in task_types.items():
+        if any(re.search(rf"\b{re.escape(keyword)}\b", text) for keyword in keywords):
+            return task_type
+    return "general"
+
+
+# --- Learning ---
+
+def outcomes_from_rows(rows: Iterable[Dict]) -> List[Dict]:
+    """
+    Turns observability rows into per-call outcomes {node, model, task, passed, cost, latency_ms}.
+    Calls whose run/iteration has no gate result yet are skipped.
+    """
+    rows = list(rows)
+    gated, passed_iterations, passed_runs = set(), set(), set()
+    cheap_latency = {}
+    for row in rows:
+        key = (row["run_id"], row["iteration"])
+        if row["node_name"] == "gate":
+            gated.add(key)
+            if row["status"] == "success":
+                passed_iterations.add(key)
+                passed_runs.add(row["run_id"])
+        elif row["node_name"] == "dev_cheap_attempt":
+            cheap_latency[key] = row["latency_ms"] or 0.0
+    gated_runs = {run for run, _ in gated}
+
+    outcomes = []
+    for row in rows:
+        key = (row["run_id"], row["iteration"])
+        node, model = row["node_name"], row["model"]
+        if not model or node == "gate":
+            continue
+        latency = row["latency_ms"] or 0.0
+        if node == "planner":
+            if row["run_id"] not in gated_runs:
+                continue
+            passed = row["run_id"] in passed_runs
+        elif key not in gated:
+            continue
+        elif node == "dev_cheap_attempt":
+            node, passed = "dev", False
+        else:
+            passed = key in passed_iterations and row["status"] == "success"
+            if row["is_fallback"]:
+                # The dev row's latency includes the cheap attempt that preceded the fallback.
+                latency = max(0.0, latency - cheap_latency.get(key, 0.0))
+        outcomes.append({"node": node, "model": model, "task": row.get("task") or "", "passed": passed,
+                         "cost": row["cost_usd"] or 0.0, "latency_ms": latency})
+    return outcomes
+
+
+def aggregate(outcomes: Iterable[Dict], task_types: Dict[str, List[str]]) -> Dict[Tuple[str, str, str], Dict]:
+    """Per-arm totals keyed by (node, task type, model); task type "*" pools every type."""
+    stats = {}
+    for outcome in outcomes:
+        task_type = classify_task(outcome["task"], task_types)
+        for key in ((outcome["node"], task_type, outcome["model"]), (outcome["node"], ALL_TYPES, outcome["model"])):
+            arm = stats.setdefault(key, {"n": 0, "passes": 0, "cost": 0.0, "latency_ms": 0.0})
+            arm["n"] += 1
+            arm["passes"] += int(outcome["passed"])
+            arm["cost"] += outcome["cost"]
+            arm["latency_ms"] += outcome["latency_ms"]
+    return stats
+
+
+def load_arm_stats(settings: dict) -> Dict[Tuple[str, str, str], Dict]:
+    """Arm statistics from the indexed observability log over the last `window_days`."""
+    from utils import metrics_index
+
+    conn = metrics_index.connect()
+    try:
+        metrics_index.sync(conn)
+        rows = metrics_index.fetch_rows(conn, LEARNED_NODES, since_days=settings["window_days"])
+    finally:
+        conn.close()
+    return aggregate(outcomes_from_rows(rows), settings["task_types"])
+
+
+# --- Choosing ---
+
+def _list_price(model: str) -> float:
+    input_price, output_price = resolve_model_costs(model) or (0.0, 0.0)
+    return input_price + output_price
+
+
+def choose(node: str, task_type: str, models: List[str], stats: Dict, settings: dict,
+           policy: str = "cheap-first", rng: Optional[random.Random] = None) -> Dict:
+    """
+    Picks a model for (node, task_type). Returns {"model", "reason", "arms"}; each arm
+    reports the evidence used (context or pooled), its pass rate and cost × latency.
+    """
+    rng = rng or random.Random()
+    min_samples, min_pass = max(1, int(settings["min_samples"])), float(settings["min_pass_rate"])
+    # Exploration order follows the cost policy: cheapest list price first unless quality is preferred.
+    ordered = sorted(models, key=_list_price, reverse=(policy == "best-quality"))
+
+    arms = []
+    for model in ordered:
+        arm, evidence = stats.get((node, task_type, model)), task_type
+        if not arm or arm["n"] < min_samples:
+            arm, evidence = stats.get((node, ALL_TYPES, model)), "all task types"
+        n = arm["n"] if arm else 0
+        passes = arm["passes"] if arm else 0
+        cost = arm["cost"] / n if n else None
+        latency_s = arm["latency_ms"] / n / 1000 if n else None
+        sampled = rng.betavariate(1 + passes, 1 + n - passes)
+        arms.append({
+            "model": model,
+            "evidence": evidence,
+            "n": n,
+            "pass_rate": round(passes / n, 3) if n else None,
+            "pass_sample": round(sampled, 3),
+            "cost_usd": cost,
+            "latency_s": latency_s,
+            "cost_x_latency": cost * latency_s if n else None,
+            "feasible": sampled >= min_pass,
+        })
+
+    unexplored = [arm for arm in arms if arm["n"] < min_samples]
+    if unexplored:
+        pick = unexplored[0]
+        reason = f"exploring: {pick['n']}/{min_samples} outcomes for {node}"
+    elif policy == "best-quality":
+        pick = max(arms, key=lambda a: (a["pass_sample"], -a["cost_x_latency"]))
+        reason = f"best-quality: highest sampled pass rate {pick['pass_sample']:.2f} (observed {pick['pass_rate']:.2f}, n={pick['n']})"
+    else:
+        feasible = [arm for arm in arms if arm["feasible"]]
+        if feasible:
+            pick = min(feasible, key=lambda a: a["cost_x_latency"])
+            reason = (f"cheapest cost×latency ({pick['cost_x_latency']:.4g} $·s) among models with sampled pass "
+                      f"rate ≥ {min_pass:.2f}; observed {pick['pass_rate']:.2f} (n={pick['n']}, {pick['evidence']})")
+        else:
+            pick = max(arms, key=lambda a: a["pass_sample"])
+            reason = f"no model clears pass rate {min_pass:.2f}; picking the highest sampled pass rate {pick['pass_sample']:.2f}"
+    return {"model": pick["model"], "reason": reason, "arms": arms}
+
+
+def _format_arm(arm: Dict) -> str:
+    if not arm["n"]:
+        return f"{arm['model']} (no data)"
+    return f"{arm['model']} pass {arm['pass_rate']:.2f} n={arm['n']} ${arm['cost_usd']:.4f} {arm['latency_s']:.1f}s"
+
+
+def route(node: str, task: str, spec: dict, default: str) -> str:
+    """
+    The model `node` should use for `task`: `default` unless `routing.adaptive.enabled`.
+    Decisions are printed, logged as a `router` metric and appended to DECISIONS_FILE.
+    """
+    settings = get_router_settings(spec)
+    if not settings["enabled"]:
+        return default
+    start_time = time.time()
+    try:
+        models = candidates_for(node, spec, settings)
+        policy = spec.get("routing", {}).get("cost_policy", {}).get("prefer", "cheap-first")
+        task_type = classify_task(task, settings["task_types"])
+        decision = choose(node, task_type, models, load_arm_stats(settings), settings, policy)
+    except Exception as e:
+        print(f"⚠️ Model router failed ({e}); using {default}.")
+        return default
+
+    model = decision["model"]
+    print(f"🧭 Router [{node}/{task_type}] → {model}: {decision['reason']}. "
+          f"Arms: {'; '.join(_format_arm(arm) for arm in decision['arms'])}")
+    context = current_run_context()
+    record = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "node": node,
+        "task_type": task_type,
+        "policy": policy,
+        "model": model,
+        "reason": decision["reason"],
+        "arms": decision["arms"],
+        **{key: context.get(key) for key in ("thread_id", "run_id", "iteration")},
+    }
+    DECISIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(DECISIONS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    kind = "explore" if decision["reason"].startswith("exploring") else "exploit"
+    log_metric("router", kind, (time.time() - start_time) * 1000, model=model)
+    return model
@@ -0,0 +1,167 @@
+"""
+Semantic cache of planner output.
+
+Tasks are embedded with a local sentence-transformers model and compared by cosine
+similarity with earlier tasks; a close enough match reuses that task's plan instead of
+calling the planner LLM. Entries are scoped by a hash of the spec sections a plan
+depends on (project goals, acceptance criteria, planner model), so changing any of
+them starts a fresh cache. Without sentence-transformers a hashed bag-of-words /
+character-trigram embedding is used; it can't tell "RSI on ETH" from "MACD on BTC"
+well, so it gets its own, stricter threshold and only catches near-verbatim repeats.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.file_lock import file_lock
+
+CACHE_DIR = Path("artifacts/plan_cache")
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "threshold": 0.9,
+    "fallback_threshold": 0.95,
+    "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
+    "max_entries": 500,
+}
+HASHED_DIM = 1024
+
+
+def get_plan_cache_settings(spec: dict) -> dict:
+    """Reads `routing.plan_cache` from the spec, filling in defaults."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(spec.get("routing", {}).get("plan_cache", {}) or {})
+    return settings
+
+
+def spec_hash(spec: dict) -> str:
+    """Hash of the spec sections that shape a plan; a change invalidates cached plans."""
+    scoped = {
+        "project": spec.get("project", {}),
+        "acceptance": spec.get("acceptance", {}),
+        "planner_llm": spec.get("routing", {}).get("planner_llm"),
+    }
+    return hashlib.sha256(json.dumps(scoped, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+# --- Embeddings ---
+
+@lru_cache(maxsize=2)
+def _load_sentence_model(model_name: str):
+    """Loads the sentence-transformers model once per process, or returns None if unavailable."""
+    try:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    except Exception as e:  # not installed, or the model can't be downloaded
+        print(f"⚠️ Plan cache: {model_name} unavailable ({type(e).__name__}); using hashed token embeddings.")
+        return None
+
+
+def _tokens(text: str) -> List[str]:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    trigrams = [f"#{w[i:i + 3]}" for w in words for i in range(max(1, len(w) - 2))]
+    return words + trigrams
+
+
+def _hashed_embedding(text: str):
+    import numpy as np
+
+    vector = np.zeros(HASHED_DIM, dtype=np.float32)
+    for token in _tokens(text):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest()
+        vector[int.from_bytes(digest, "little") % HASHED_DIM] += 1.0
+    return vector
+
+
+def embed(text: str, model_name: str) -> Tuple[str, "np.ndarray"]:
+    """Returns (embedder id, unit-length vector) for `text`."""
+    import numpy as np
+
+    model = _load_sentence_model(model_name)
+    if model is not None:
+        embedder, vector = model_name, np.asarray(model.encode(text), dtype=np.float32)
+    else:
+        embedder, vector = f"hashed-{HASHED_DIM}", _hashed_embedding(text)
+    norm = float(np.linalg.norm(vector))
+    return embedder, vector / norm if norm else vector
+
+
+# --- Store ---
+
+def _scope_file(scope: str, embedder: str) -> Path:
+    # Vectors from different embedders aren't comparable, so each gets its own file.
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", embedder)
+    return CACHE_DIR / scope / f"{safe}.jsonl"
+
+
+@lru_cache(maxsize=8)
+def _load_entries(path: Path, mtime_ns: int):
+    """Parses a scope file into (entries, vector matrix). Keyed by mtime so writes invalidate it."""
+    import numpy as np
+
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    matrix = np.asarray([e["vector"] for e in entries], dtype=np.float32) if entries else None
+    return entries, matrix
+
+
+def lookup(task: str, spec: dict) -> Optional[Dict]:
+    """
+    Returns the cached entry most similar to `task` if its cosine similarity reaches the
+    threshold, with `similarity` added; otherwise None.
+    """
+    settings = get_plan_cache_settings(spec)
+    if not settings["enabled"]:
+        return None
+    embedder, vector = embed(task, settings["embedding_model"])
+    path = _scope_file(spec_hash(spec), embedder)
+    if not path.exists():
+        return None
+    entries, matrix = _load_entries(path, path.stat().st_mtime_ns)
+    if matrix is None:
+        return None
+    similarities = matrix @ vector
+    best = int(similarities.argmax())
+    threshold = settings["fallback_threshold"] if embedder.startswith("hashed-") else settings["threshold"]
+    if float(similarities[best]) < float(threshold):
+        return None
+    entry = {k: v for k, v in entries[best].items() if k != "vector"}
+    entry["similarity"] = round(float(similarities[best]), 4)
+    return entry
+
+
+def store(task: str, plan: str, spec: dict):
+    """Adds a freshly generated plan to the cache, keeping at most `max_entries` per scope."""
+    settings = get_plan_cache_settings(spec)
+    if not settings["enabled"]:
+        return
+    embedder, vector = embed(task, settings["embedding_model"])
+    path = _scope_file(spec_hash(spec), embedder)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entry = {"task": task, "plan": plan, "created_at": time.time(), "vector": [round(float(x), 6) for x in vector]}
+    # Queue workers share the scope file; the lock keeps concurrent stores from dropping each other's entries.
+    with file_lock(path):
+        lines = path.read_text(encoding="utf-8").splitlines() if path.exists() else []
+        keep = max(0, int(settings["max_entries"]) - 1)
+        lines = [line for line in lines if line.strip()][-keep:] if keep else []
+        lines.append(json.dumps(entry, ensure_ascii=False))
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        tmp.replace(path)
+
+
+def adapt_plan(entry: Dict, task: str) -> str:
+    """Reuses a cached plan for `task`, noting which task it was written for."""
+    if entry["task"].strip() == task.strip():
+        return entry["plan"]
+    return (
+        f"> Plan reused from a similar task (similarity {entry['similarity']:.2f}): \"{entry['task']}\".\n"
+        f"> Apply it to the current task: \"{task}\".\n\n{entry['plan']}"
+    )
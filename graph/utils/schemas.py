@@ -16,14 +16,43 @@ TASK_SCHEMA = {
         "required": ["file", "action"],
         "properties": {
           "file": {"type": "string", "minLength": 1},
-          "action": {"type": "string", "enum": ["add", "modify", "delete"]},
-          "content": {"type": "string"}
-        }
+          "action": {"type": "string", "enum": ["add", "modify", "delete", "patch"]},
+          "content": {"type": "string"},
+          "hunks": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+              "type": "object",
+              "required": ["search", "replace"],
+              "properties": {
+                "search": {"type": "string", "minLength": 1},
+                "replace": {"type": "string"}
+              }
+            }
+          },
+          "diff": {"type": "string", "minLength": 1}
+        },
+        "if": {"properties": {"action": {"const": "patch"}}},
+        "then": {"anyOf": [{"required": ["hunks"]}, {"required": ["diff"]}]}
       }
     },
     "commands": {
       "type": "array",
-      "items": {"type": "string"}
+      "items": {
+        "oneOf": [
+          {"type": "string"},
+          {
+            "type": "object",
+            "required": ["run"],
+            "properties": {
+              "name": {"type": "string", "minLength": 1},
+              "run": {"type": "string", "minLength": 1},
+              "needs": {"type": "array", "items": {"type": "string"}},
+              "timeout_s": {"type": "number", "exclusiveMinimum": 0}
+            }
+          }
+        ]
+      }
     },
     "pr": {
       "type": "object",
@@ -1,12 +1,31 @@
-from typing import TypedDict, Optional, Dict, Any, NotRequired
+from typing import TypedDict, Optional, Dict, Any, NotRequired, Annotated, List, Union
+import operator
+
+# Large fields (plan, code_diff, backtest_report, error, correction_suggestion, batch_results)
+# may hold a blob reference {"$blob": <sha256>, "bytes": <size>} instead of the value itself;
+# read them with graph.utils.blob_store.load().
+BlobRef = Dict[str, Any]
+
 
 class P1State(TypedDict):
     task: str
-    plan: NotRequired[str]
-    code_diff: NotRequired[str]
+    thread_id: NotRequired[str]
+    plan: NotRequired[Union[str, BlobRef]]
+    # The parsed `changes` list, an "Error: ..." message if the dev output was unusable, or a blob ref.
+    code_diff: NotRequired[Union[List[Dict[str, Any]], str, BlobRef]]
     backtest_report: NotRequired[dict]
     pr_url: NotRequired[str]
     gate_passed: NotRequired[bool]
     current_step: NotRequired[str]
     job_id: NotRequired[str]
-    correction_suggestion: NotRequired[str]
+    # Dev -> executor -> gate loop count; names the run's artifact directory.
+    iteration: NotRequired[int]
+    correction_suggestion: NotRequired[Union[str, BlobRef]]
+    error: NotRequired[Union[str, BlobRef]]
+    leak_findings: NotRequired[List[Dict[str, Any]]]
+    # Results fetched ahead of the run by batch mode, keyed by node ("planner", "dev"):
+    # {"batch_id", "model", "content", "input_tokens", "output_tokens", "cost_usd"}.
+    batch_results: NotRequired[Dict[str, Dict[str, Any]]]
+    # --- Best-of-N fan-out mode ---
+    fanout_round: NotRequired[int]
+    candidates: NotRequired[Annotated[List[Dict[str, Any]], operator.add]]
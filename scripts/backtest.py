@@ -1,55 +1,76 @@
 #!/usr/bin/env python3
 import argparse
+import csv
 import json
 import random
-import pandas as pd
+import sys
+from datetime import datetime, timedelta
 from pathlib import Path
 
-def run_backtest(pair: str, tf: str, out_path: str):
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import artifact_store
+from utils.backtest_metrics import TradeMetrics
+from utils.early_stopping import SequentialGate
+
+BAR = timedelta(hours=4)
+
+def simulate_trades(num_trades: int, start: datetime = datetime(2024, 1, 1)):
+    """Yields simulated trades one at a time: (entry_time, exit_time, pnl, mfe, mae)."""
+    for i in range(num_trades):
+        pnl = random.random() * 0.02 - 0.007
+        mfe = max(0, pnl + random.random() * 0.005)
+        mae = max(0, -pnl + random.random() * 0.005)
+        entry_time = start + i * BAR
+        exit_time = entry_time + timedelta(minutes=random.randint(15, 240))
+        yield entry_time, exit_time, pnl, mfe, mae
+
+def run_backtest(pair: str, tf: str, out_path: str, seed: int = None, criteria: list = None, early_stop: dict = None):
     """
     A minimal, simulated backtesting script.
     It generates a randomized summary report and a detailed trade log.
+    Pass `seed` for a reproducible run (used by the offline benchmarks).
+    With compiled acceptance `criteria` (graph.utils.gate.compile_criteria) the run stops
+    as soon as one of them cannot be met and writes a partial report marked `early_stopped`.
     """
     print(f"Running simulated backtest for {pair} on {tf} timeframe...")
-    
-    # --- Generate Detailed Trade Log ---
-    num_trades = random.randint(80, 120)
-    pnl = [(random.random() * 0.02 - 0.007) for _ in range(num_trades)]
-    trade_data = {
-        'entry_time': pd.to_datetime(pd.date_range(start='2024-01-01', periods=num_trades, freq='4H')),
-        'pnl_usd': [p * 1000 for p in pnl],
-        'mfe': [max(0, p + random.random() * 0.005) for p in pnl],
-        'mae': [max(0, -p + random.random() * 0.005) for p in pnl],
-    }
-    trade_log = pd.DataFrame(trade_data)
-    
-    # --- Calculate Summary Metrics from Trade Log ---
-    winrate = (trade_log['pnl_usd'] > 0).mean()
-    mfe_mean = trade_log['mfe'].mean()
-    mae_mean = trade_log['mae'].mean()
-    trades_per_day = num_trades / (trade_log['entry_time'].max() - trade_log['entry_time'].min()).days
-
-    result = {
-        "winrate": round(winrate, 4),
-        "mfe": round(mfe_mean, 4),
-        "mae": round(mae_mean, 4),
-        "trades_per_day": round(trades_per_day, 2),
-        "notes": "Simulated run. This version now generates a detailed trade log."
-    }
-    
-    # --- Save Artifacts ---
+    if seed is not None:
+        random.seed(seed)
+
     output_path = Path(out_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    trade_log_path = output_path.parent / "trade_log.csv"
+
+    # --- Stream Trades into the Log and the Metrics Accumulator ---
+    # Each trade is written and folded in as it is produced, so memory stays flat for long sweeps.
+    metrics = TradeMetrics()
+    num_trades = random.randint(80, 120)
+    stop_rule = SequentialGate(criteria, num_trades, early_stop) if criteria else None
+    evidence = None
+    with artifact_store.open_for_write(trade_log_path, 'w', newline='', encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["entry_time", "exit_time", "pnl_usd", "mfe", "mae"])
+        for entry_time, exit_time, pnl, mfe, mae in simulate_trades(num_trades):
+            writer.writerow([entry_time.isoformat(), exit_time.isoformat(), round(pnl * 1000, 6), round(mfe, 6), round(mae, 6)])
+            metrics.add(pnl, mfe, mae, entry_time, exit_time)
+            evidence = stop_rule.check(metrics) if stop_rule else None
+            if evidence:
+                break
+    artifact_store.commit_file(f.name, trade_log_path)
 
-    # Save summary JSON
-    with open(output_path, 'w', encoding="utf-8") as f:
-        json.dump(result, f, indent=2)
+    summary = metrics.summary()
+    result = {key: (round(value, 2 if key == "trades_per_day" else 4) if isinstance(value, float) else value)
+              for key, value in summary.items()}
+    result["notes"] = "Simulated run. Metrics are accumulated in a single pass over the trade stream."
+    if evidence:
+        print(f"⏹️ Early stop after {evidence['trades']}/{num_trades} trades: {evidence['reason']}")
+        result["early_stopped"] = True
+        result["early_stop"] = evidence
+        result["notes"] += f" Stopped early after {evidence['trades']} of {num_trades} planned trades; metrics cover those trades only."
+
+    # --- Save Summary ---
+    artifact_store.write_json(output_path, result)
     print(f"Backtest summary saved to {output_path}")
     print(json.dumps(result, indent=2))
-
-    # Save detailed trade log CSV
-    trade_log_path = output_path.parent / "trade_log.csv"
-    trade_log.to_csv(trade_log_path, index=False, encoding="utf-8")
     print(f"Detailed trade log saved to {trade_log_path}")
 
 if __name__ == "__main__":
@@ -57,6 +78,18 @@ if __name__ == "__main__":
     parser.add_argument("--pair", default="ETHUSDT", help="Trading pair")
     parser.add_argument("--tf", default="15m", help="Timeframe")
     parser.add_argument("--out", default="artifacts/backtest/latest.json", help="Output summary JSON path")
+    parser.add_argument("--seed", type=int, help="Random seed for a reproducible simulated run")
+    parser.add_argument("--early-stop", action=argparse.BooleanOptionalAction,
+                        help="Stop once an acceptance criterion cannot be met (default: acceptance.early_stop.enabled in the spec)")
+    parser.add_argument("--spec", default="specs/ProjectSpec.yaml", help="Project spec with the acceptance criteria")
     args = parser.parse_args()
 
-    run_backtest(args.pair, args.tf, args.out)
+    early_stop_args = {}
+    if args.early_stop is not False and Path(args.spec).exists():
+        import yaml
+        from graph.utils.gate import early_stop_kwargs
+        spec = yaml.safe_load(Path(args.spec).read_text(encoding="utf-8")) or {}
+        if args.early_stop:
+            spec.setdefault("acceptance", {}).setdefault("early_stop", {})["enabled"] = True
+        early_stop_args = early_stop_kwargs(spec)
+    run_backtest(args.pair, args.tf, args.out, args.seed, **early_stop_args)
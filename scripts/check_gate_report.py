@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Checks that a backtest report survives the trip through the artifact store to the gate:
+a strategy with no losing trades has an infinite profit factor and Sortino ratio, which
+must be written, read back as inf and pass its criteria rather than come back as null
+and fail as "missing or undefined". Run with orjson installed (it is a langsmith dependency),
+as that is the environment where a different encoder once turned inf into null.
+"""
+import importlib.util
+import math
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from graph.utils.gate import evaluate_backtest
+from utils import artifact_store
+from utils.backtest_metrics import TradeMetrics
+
+
+def zero_loss_report():
+    metrics = TradeMetrics()
+    for i in range(20):
+        metrics.add(0.01 + 0.001 * (i % 3), mfe=0.015, mae=0.002, entry_time=i * 3600, exit_time=i * 3600 + 900)
+    return metrics.summary()
+
+
+CASES = [
+    # (criteria, should pass)
+    ({"profit_factor": ">=1.5"}, True),
+    ({"sortino": ">=2"}, True),
+    ({"profit_factor": "<=1.5"}, False),
+]
+
+
+def main():
+    print(f"orjson installed: {importlib.util.find_spec('orjson') is not None}")
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        report_path = artifact_store.write_json(Path("artifacts/runs/check/001/backtest/latest.json"), zero_loss_report())
+        results = artifact_store.read_json(report_path)
+
+        for metric in ("profit_factor", "sortino"):
+            ok = results.get(metric) == math.inf
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {metric} read back as {results.get(metric)!r}")
+        for criteria, expected in CASES:
+            passed, suggestions = evaluate_backtest(results, criteria)
+            ok = passed == expected
+            failures += not ok
+            detail = f": {suggestions[0]}" if suggestions and not ok else ""
+            print(f"{'✅' if ok else '❌'} {criteria} {'passes' if passed else 'fails'}{detail}")
+        os.chdir(Path(__file__).resolve().parent.parent)
+
+    if failures:
+        print(f"\n[RESULT] ❌ Gate report check FAILED ({failures} case(s))")
+        sys.exit(1)
+    print("\n[RESULT] ✅ Gate report check PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+CLI_PATH = Path(__file__).resolve().parent.parent / "cli" / "vibe.py"
+
+# Lightweight CLI invocations that must not pay for the agent/knowledge-base stack.
+FAST_COMMANDS = [
+    ["--help"],
+    ["init", "--help"],
+    ["knowledge", "build", "--help"],
+    ["gc", "--help"],
+    ["enqueue", "--help"],
+    ["worker", "--help"],
+    ["stats", "--help"],
+    ["batch", "--help"],
+]
+
+# Top-level packages that only the subcommands doing real work may import.
+HEAVY_MODULES = {
+    "langgraph", "langchain_core", "langchain_openai", "langchain_anthropic", "langchain_community",
+    "openai", "anthropic", "pandas", "numpy", "matplotlib", "jsonschema",
+    "faiss", "sentence_transformers", "torch",
+}
+
+DEFAULT_BUDGET_MS = 150.0
+
+
+def parse_importtime(stderr: str):
+    """Parses `python -X importtime` output into (module, depth, cumulative_us) tuples."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((name.strip(), depth, int(cumulative_us)))
+    return entries
+
+
+def measure(args):
+    """Runs the CLI with `args` under -X importtime and returns its parsed import entries."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(CLI_PATH), *args],
+        capture_output=True, text=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fails if lightweight CLI commands import heavy dependencies or exceed the import-time budget.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Max cumulative import time per command, excluding interpreter startup")
+    args = parser.parse_args()
+
+    # Interpreter startup (site, encodings, .pth hooks) varies per machine and is not ours to budget.
+    startup = {name for name, depth, _ in parse_importtime(
+        subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True).stderr
+    ) if depth == 0}
+
+    print("--- VibeCoder CLI Import-Time Check ---")
+    failed = False
+    for command in FAST_COMMANDS:
+        entries = measure(command)
+        heavy = sorted({name.split(".")[0] for name, _, _ in entries if name.split(".")[0] in HEAVY_MODULES})
+        top_level = [(name, us) for name, depth, us in entries if depth == 0 and name not in startup]
+        total_ms = sum(us for _, us in top_level) / 1000
+        slowest = ", ".join(f"{name} {us / 1000:.1f}ms" for name, us in sorted(top_level, key=lambda e: -e[1])[:3])
+
+        label = " ".join(command)
+        if heavy:
+            failed = True
+            print(f"❌ vibe {label}: imports heavy modules: {', '.join(heavy)}")
+        elif total_ms > args.budget_ms:
+            failed = True
+            print(f"❌ vibe {label}: {total_ms:.1f}ms > budget {args.budget_ms:.0f}ms (slowest: {slowest})")
+        else:
+            print(f"✅ vibe {label}: {total_ms:.1f}ms (slowest: {slowest or 'n/a'})")
+
+    if failed:
+        print("\n[RESULT] ❌ Import-time check FAILED")
+        sys.exit(1)
+    print("\n[RESULT] ✅ Import-time check PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import indicators
+
+
+def synthetic_bars(n: int, seed: int):
+    """A random-walk OHLC series with flat stretches and gaps, to exercise ties and FVGs."""
+    rng = np.random.default_rng(seed)
+    steps = rng.standard_t(3, size=n) * 0.01
+    steps[rng.random(n) < 0.05] = 0.0
+    close = 100 * np.exp(np.cumsum(steps))
+    spread = np.abs(rng.normal(0, 0.01, size=n)) * close
+    high = close + spread * rng.random(n)
+    low = close - spread * rng.random(n)
+    return high, low, close
+
+
+def compare(name: str, batch, streamed, tolerance: float) -> bool:
+    """Both series must agree element-wise: same NaN positions, values within `tolerance` (relative)."""
+    batch, streamed = np.asarray(batch, dtype=np.float64), np.asarray(streamed, dtype=np.float64)
+    nan_mismatch = int((np.isnan(batch) != np.isnan(streamed)).sum())
+    both = ~np.isnan(batch) & ~np.isnan(streamed)
+    error = np.abs(batch[both] - streamed[both]) / np.maximum(1.0, np.abs(batch[both]))
+    worst = float(error.max()) if error.size else 0.0
+    ok = nan_mismatch == 0 and worst <= tolerance
+    print(f"{'✅' if ok else '❌'} {name}: max rel. error {worst:.2e}, NaN mismatches {nan_mismatch}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks that batch and streaming indicators in utils/indicators.py produce the same values.")
+    parser.add_argument("--bars", type=int, default=20_000, help="Length of the synthetic OHLC series")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=1e-8, help="Max relative difference")
+    args = parser.parse_args()
+
+    high, low, close = synthetic_bars(args.bars, args.seed)
+    window, fast, slow = 14, 20, 100
+
+    streams = {
+        "rolling_mean": indicators.RollingMean(window),
+        "rolling_std": indicators.RollingStd(window, ddof=1),
+        "rolling_max": indicators.RollingMax(window),
+        "rolling_min": indicators.RollingMin(window),
+        "atr": indicators.ATR(window),
+    }
+    fvg_stream, regime_stream = indicators.FairValueGaps(), indicators.RegimeFeatures(fast, slow, window)
+    streamed = {name: [] for name in streams}
+    streamed_fvg, streamed_regime = [], []
+    for h, l, c in zip(high, low, close):
+        streamed["rolling_mean"].append(streams["rolling_mean"].update(c))
+        streamed["rolling_std"].append(streams["rolling_std"].update(c))
+        streamed["rolling_max"].append(streams["rolling_max"].update(h))
+        streamed["rolling_min"].append(streams["rolling_min"].update(l))
+        streamed["atr"].append(streams["atr"].update(h, l, c))
+        streamed_fvg.append(fvg_stream.update(h, l))
+        streamed_regime.append(regime_stream.update(h, l, c))
+
+    print("--- Indicator Batch/Streaming Parity Check ---")
+    batch = {
+        "rolling_mean": indicators.rolling_mean(close, window),
+        "rolling_std": indicators.rolling_std(close, window, ddof=1),
+        "rolling_max": indicators.rolling_max(high, window),
+        "rolling_min": indicators.rolling_min(low, window),
+        "atr": indicators.atr(high, low, close, window),
+    }
+    results = [compare(name, batch[name], streamed[name], args.tolerance) for name in batch]
+
+    gaps = indicators.fair_value_gaps(high, low)
+    for key in ("bullish", "bearish", "top", "bottom"):
+        results.append(compare(f"fair_value_gaps.{key}", gaps[key], [g[key] for g in streamed_fvg], args.tolerance))
+
+    regime = indicators.regime_features(high, low, close, fast, slow, window)
+    for key in regime:
+        results.append(compare(f"regime_features.{key}", regime[key], [r[key] for r in streamed_regime], args.tolerance))
+
+    bullish, bearish = int(gaps["bullish"].sum()), int(gaps["bearish"].sum())
+    print(f"\n{args.bars} bars, {bullish} bullish / {bearish} bearish gaps")
+    if not all(results):
+        print("[RESULT] ❌ Indicator parity check FAILED")
+        sys.exit(1)
+    print("[RESULT] ✅ Indicator parity check PASSED")
+
+
+if __name__ == "__main__":
+    main()
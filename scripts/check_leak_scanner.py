@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Checks the built-in leak scanner rules (utils/leak_scanner.py) on generated credentials
+and on ordinary code that names tokens and keys. Every credential must be reported and
+none of the identifier lines may be, since any finding sends the changes back to the dev node.
+
+The credentials are random and assembled at runtime, so this file has nothing for gitleaks to flag.
+"""
+import random
+import string
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.leak_scanner import DEFAULT_RULES, RuleSet
+
+
+def random_token(rng: random.Random, length: int, alphabet: str = string.ascii_letters + string.digits) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+def leaked_lines(rng: random.Random):
+    """(expected rule, line) pairs that must be reported."""
+    upper = string.ascii_uppercase + string.digits
+    return [
+        ("aws-access-token", f'aws_access_key_id = "{"AK" + "IA" + random_token(rng, 16, upper)}"'),
+        ("github-pat", f'GITHUB_TOKEN = "{"gh" + "p_" + random_token(rng, 36)}"'),
+        ("generic-api-key", f'api_token = "{random_token(rng, 32)}"'),
+        ("generic-api-key", f"AUTH_TOKEN: {random_token(rng, 40, string.hexdigits.lower()[:16])}"),
+        ("generic-api-key", f"client_key => '{random_token(rng, 24)}'"),
+        ("generic-api-key", f'exchange_access = "prod_{random_token(rng, 20)}"'),
+    ]
+
+
+# Ordinary code the generic rule must leave alone.
+IDENTIFIER_LINES = [
+    "max_tokens = DEFAULT_MAX_OUTPUT_TOKENS_PER_CALL",
+    'api_key = os.environ.get("OPENAI_API_KEY")',
+    "token = settings.github_token_v2",
+    "self.access_token = refresh_access_token(client)",
+    "key: ANTHROPIC_API_KEY",
+    "auth_header = request.headers.authorization",
+    "api_base = config.OPENAI_BASE_URL",
+    "credentials = load_credentials_from_file(path)",
+    "input_tokens = usage.get('input_tokens', 0)",
+    "cache_key = plan_cache.embedding_key",
+    "TOKEN_LIMIT = MAX_CONTEXT_TOKENS_V2",
+]
+
+
+def main():
+    rules = RuleSet({"rules": DEFAULT_RULES})
+    rng = random.Random(0)
+    failures = 0
+    for expected, line in leaked_lines(rng):
+        found = [f["RuleID"] for f in rules.scan(line)]
+        ok = expected in found
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} leak reported as {expected}: {found or 'nothing'}")
+    for line in IDENTIFIER_LINES:
+        found = [f["RuleID"] for f in rules.scan(line)]
+        failures += bool(found)
+        print(f"{'❌' if found else '✅'} identifier not reported: {line!r}{f' -> {found}' if found else ''}")
+
+    if failures:
+        print(f"\n[RESULT] ❌ Leak scanner check FAILED ({failures} case(s))")
+        sys.exit(1)
+    print("\n[RESULT] ✅ Leak scanner check PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Checks the unified-diff handling in executors/patching.py on edge cases models produce:
+content lines that look like file headers (`-- ` SQL comments, `++ ` text), blank context
+lines without their leading space, form feeds, and lines with no prefix at all.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from executors.patching import PatchError, apply_unified_diff
+
+SQL = "SELECT 1;\n-- old comment\nSELECT 2;\n"
+MARKDOWN = "# Title\n\nIntro\n"
+
+# (name, original, diff, expected result or None if the diff must be rejected)
+CASES = [
+    (
+        "removed line starting with '-- '",
+        SQL,
+        "--- a/q.sql\n+++ b/q.sql\n@@ -1,3 +1,3 @@\n SELECT 1;\n--- old comment\n+-- new comment\n SELECT 2;\n",
+        "SELECT 1;\n-- new comment\nSELECT 2;\n",
+    ),
+    (
+        "added line starting with '++ '",
+        MARKDOWN,
+        "--- a/README.md\n+++ b/README.md\n@@ -1,3 +1,4 @@\n # Title\n \n+++ counter\n Intro\n",
+        "# Title\n\n++ counter\nIntro\n",
+    ),
+    (
+        "second hunk after headers and a blank context line",
+        "a\nb\n\nc\nd\ne\nf\ng\n",
+        "--- a/f\n+++ b/f\n@@ -1,2 +1,2 @@\n-a\n+A\n b\n@@ -3,3 +3,3 @@\n\n c\n-d\n+D\n",
+        "A\nb\n\nc\nD\ne\nf\ng\n",
+    ),
+    (
+        "form feed inside a context line",
+        "x\n\fy\nz\n",
+        "@@ -1,3 +1,3 @@\n x\n \fy\n-z\n+Z\n",
+        "x\n\fy\nZ\n",
+    ),
+    (
+        "line without a ' ', '+' or '-' prefix",
+        "a\nb\n",
+        "@@ -1,2 +1,2 @@\n a\nb\n",
+        None,
+    ),
+]
+
+
+def main():
+    failures = 0
+    for name, original, diff, expected in CASES:
+        try:
+            result, error = apply_unified_diff(original, diff), None
+        except PatchError as e:
+            result, error = None, str(e)
+        ok = result == expected
+        failures += not ok
+        outcome = f"rejected: {error}" if error else "applied"
+        print(f"{'✅' if ok else '❌'} {name}: {outcome}{'' if ok else f' -> {result!r}'}")
+
+    if failures:
+        print(f"\n[RESULT] ❌ Patching check FAILED ({failures} case(s))")
+        sys.exit(1)
+    print("\n[RESULT] ✅ Patching check PASSED")
+
+
+if __name__ == "__main__":
+    main()
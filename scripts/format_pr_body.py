@@ -1,17 +1,31 @@
 #!/usr/bin/env python3
+import argparse
 import json
+import os
+import sys
 import yaml
 from pathlib import Path
 
-def format_pr_body():
+# Add project root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from executors.patching import summarize_change
+from utils import artifact_store
+
+def format_pr_body(thread_id: str = None):
     """
     Generates a complete, structured Markdown body for a Pull Request
     by consolidating information from the task, plan, results, and spec.
+    Reads the latest run of `thread_id`, or the shared `latest` artifacts without one.
     """
+    run_dir = Path("artifacts")
+    if thread_id:
+        run_dir = artifact_store.latest_run(thread_id) or run_dir
+
     # --- Load Data Sources ---
     try:
-        task_data = json.loads(Path("artifacts/exec/task.json").read_text(encoding="utf-8"))
-        backtest_results = json.loads(Path("artifacts/backtest/latest.json").read_text(encoding="utf-8"))
+        task_data = json.loads((run_dir / "exec" / "task.json").read_text(encoding="utf-8"))
+        backtest_results = json.loads((run_dir / "backtest" / "latest.json").read_text(encoding="utf-8"))
         spec = yaml.safe_load(Path("specs/ProjectSpec.yaml").read_text(encoding="utf-8"))
     except FileNotFoundError as e:
         print(f"## 💥 VibeCoder Report Error\n\nMissing required artifact: {e.filename}")
@@ -29,7 +43,8 @@ def format_pr_body():
         for change in changes:
             action = change.get('action', 'N/A').upper()
             file_path = change.get('file', 'N/A')
-            changes_md += f"- **{action}**: `{file_path}`\n"
+            summary = summarize_change(change)
+            changes_md += f"- **{action}**: `{file_path}`" + (f" ({summary})" if summary else "") + "\n"
     else:
         changes_md = "Could not parse structured changes."
 
@@ -70,4 +85,8 @@ This change is isolated to the new modules and can be reverted by rolling back t
     print(pr_body.strip())
 
 if __name__ == "__main__":
-    format_pr_body()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--thread", help="Thread whose latest run to report on. Defaults to the shared latest artifacts.")
+    args = parser.parse_args()
+
+    format_pr_body(args.thread)
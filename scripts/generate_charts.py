@@ -1,19 +1,30 @@
 #!/usr/bin/env python3
+import argparse
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
 
-TRADE_LOG_PATH = Path("artifacts/backtest/trade_log.csv")
-CHART_DIR = Path("artifacts/charts")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-def generate_charts():
-    """Reads the detailed trade log and generates performance charts."""
-    if not TRADE_LOG_PATH.exists():
-        print(f"Trade log not found at {TRADE_LOG_PATH}. Run backtest first.")
+from utils import artifact_store
+
+def save_chart(path: Path):
+    """Saves the current figure atomically through the artifact store."""
+    with artifact_store.open_for_write(path, 'wb') as f:
+        plt.savefig(f, format="png")
+    artifact_store.commit_file(f.name, path)
+    plt.close()
+
+def generate_charts(run_dir: str = "artifacts"):
+    """Reads the detailed trade log of `run_dir` and generates performance charts."""
+    trade_log_path = Path(run_dir) / "backtest" / "trade_log.csv"
+    chart_dir = Path(run_dir) / "charts"
+    if not trade_log_path.exists():
+        print(f"Trade log not found at {trade_log_path}. Run backtest first.")
         return
 
-    df = pd.read_csv(TRADE_LOG_PATH)
-    CHART_DIR.mkdir(parents=True, exist_ok=True)
+    df = pd.read_csv(trade_log_path)
 
     # 1. Cumulative P/L Chart
     df['cumulative_pnl'] = df['pnl_usd'].cumsum()
@@ -24,9 +35,8 @@ def generate_charts():
     plt.ylabel('P/L (USD)')
     plt.grid(True)
     plt.legend()
-    pnl_chart_path = CHART_DIR / "pnl_curve.png"
-    plt.savefig(pnl_chart_path)
-    plt.close()
+    pnl_chart_path = chart_dir / "pnl_curve.png"
+    save_chart(pnl_chart_path)
     print(f"P/L curve chart saved to {pnl_chart_path}")
 
     # 2. MFE/MAE Distribution Chart
@@ -37,10 +47,13 @@ def generate_charts():
     plt.ylabel('Max Favorable Excursion (MFE)')
     plt.grid(True)
     plt.axline((0, 0), slope=1, color='gray', linestyle='--') # Profit/Loss line
-    dist_chart_path = CHART_DIR / "mfe_mae_distribution.png"
-    plt.savefig(dist_chart_path)
-    plt.close()
+    dist_chart_path = chart_dir / "mfe_mae_distribution.png"
+    save_chart(dist_chart_path)
     print(f"MFE/MAE distribution chart saved to {dist_chart_path}")
 
 if __name__ == "__main__":
-    generate_charts()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run-dir", default="artifacts", help="Artifact directory of the run (e.g. artifacts/runs/<thread>/<iteration>)")
+    args = parser.parse_args()
+
+    generate_charts(args.run_dir)
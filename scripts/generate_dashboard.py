@@ -19,8 +19,8 @@ def generate_dashboard():
     total_cost = df['cost_usd'].sum()
     total_tokens = df['total_tokens'].sum()
     
-    # Node-level stats
-    node_stats = df.groupby('node_name').agg(
+    # Node-level stats (plan cache rows record hit/miss rather than success/fail)
+    node_stats = df[df['node_name'] != 'plan_cache'].groupby('node_name').agg(
         avg_latency_ms=('latency_ms', 'mean'),
         success_rate=('status', lambda x: (x == 'success').mean()),
         total_cost=('cost_usd', 'sum'),
@@ -31,6 +31,18 @@ def generate_dashboard():
     gate_df = df[df['node_name'] == 'gate']
     pr_pass_rate = gate_df['status'].eq('success').mean() if not gate_df.empty else 0
 
+    # Plan cache hit rate
+    cache_df = df[df['node_name'] == 'plan_cache']
+    cache_hit_rate = cache_df['status'].eq('hit').mean() if not cache_df.empty else 0
+
+    # Most expensive threads (rows logged before run attribution have no thread_id)
+    thread_df = df[df['thread_id'].notna()] if 'thread_id' in df else df.iloc[0:0]
+    thread_stats = thread_df.groupby('thread_id').agg(
+        total_cost=('cost_usd', 'sum'),
+        total_latency_ms=('latency_ms', 'sum'),
+        iterations=('iteration', 'max'),
+    ).sort_values('total_cost', ascending=False).head(10).reset_index()
+
     # --- Build Markdown ---
     md = []
     md.append("# VibeCoder Observability Dashboard")
@@ -42,6 +54,7 @@ def generate_dashboard():
     md.append(f"| **Total Cost (USD)** | `${total_cost:.4f}` |")
     md.append(f"| **Total Tokens** | `{total_tokens:,.0f}` |")
     md.append(f"| **PR Pass Rate (Gate Success)** | `{pr_pass_rate:.2%}` |")
+    md.append(f"| **Plan Cache Hit Rate** | `{cache_hit_rate:.2%}` ({len(cache_df)} lookups) |")
 
     md.append("\n## 📊 Node-Level Statistics")
     md.append("| Node Name | Avg Latency (ms) | Success Rate | Total Cost (USD) | Total Tokens |")
@@ -49,6 +62,14 @@ def generate_dashboard():
     for _, row in node_stats.iterrows():
         md.append(f"| `{row['node_name']}` | `{row['avg_latency_ms']:.2f}` | `{row['success_rate']:.2%}` | `${row['total_cost']:.4f}` | `{row['total_tokens']:,.0f}` |")
 
+    if not thread_stats.empty:
+        md.append("\n## 💸 Most Expensive Threads")
+        md.append("| Thread | Total Cost (USD) | Total Latency (s) | Iterations |")
+        md.append("|---|---|---|---|")
+        for _, row in thread_stats.iterrows():
+            md.append(f"| `{row['thread_id']}` | `${row['total_cost']:.4f}` | `{row['total_latency_ms'] / 1000:.1f}` | `{row['iterations']:.0f}` |")
+        md.append("\nUse `python cli/vibe.py stats --thread <id>` for a per-iteration, per-node breakdown.")
+
     md.append("\n## 📜 Recent Runs")
     md.append(df.tail(10).to_markdown(index=False))
 
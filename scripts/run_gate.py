@@ -4,6 +4,11 @@ import sys
 import yaml
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from graph.utils.gate import check_criteria, format_interval
+from utils.resampling import get_confidence_settings, intervals_for_report
+
 def evaluate_gate():
     """
     Reads backtest results and spec criteria to determine if the gate passes.
@@ -35,44 +40,23 @@ def evaluate_gate():
     print(json.dumps(results, indent=2))
     
     # 3. Compare results against criteria
-    passed = True
+    confidence = get_confidence_settings(spec)
+    intervals = intervals_for_report(results_path, confidence)
+    checks = check_criteria(results, criteria, intervals, confidence["bound"])
+    passed = all(check["ok"] for check in checks)
     report_lines = ["\n--- Gate Report ---"]
-    
-    # Winrate check
-    winrate_crit_str = criteria.get("sample_out_winrate", ">=0.0").replace(">=", "")
-    winrate_crit = float(winrate_crit_str)
-    if results["winrate"] < winrate_crit:
+    for check in checks:
+        icon = "✅" if check["ok"] else "❌"
+        value = "missing" if check["value"] is None else check["value"]
+        interval = f", {format_interval(check['metric'], check['interval'], confidence['level'])}" if check["interval"] else ""
+        report_lines.append(f"{icon} {check['metric']}: {value}{interval} (required {check['op']}{check['threshold']})")
+    if intervals:
+        report_lines.append(f"Intervals are judged on the {confidence['bound']} bound.")
+    if results.get("early_stopped"):
+        # A partial report never passes; see utils/early_stopping.py.
+        evidence = results["early_stop"]
         passed = False
-        report_lines.append(f"❌ Winrate: {results['winrate']:.2%} < required {winrate_crit:.2%}")
-    else:
-        report_lines.append(f"✅ Winrate: {results['winrate']:.2%} >= required {winrate_crit:.2%}")
-
-    # MFE check
-    mfe_crit_str = criteria.get("mfe_target", ">=0.0").replace(">=", "")
-    mfe_crit = float(mfe_crit_str)
-    if results["mfe"] < mfe_crit:
-        passed = False
-        report_lines.append(f"❌ MFE: {results['mfe']:.3%} < target {mfe_crit:.3%}")
-    else:
-        report_lines.append(f"✅ MFE: {results['mfe']:.3%} >= target {mfe_crit:.3%}")
-
-    # MAE check
-    mae_crit_str = criteria.get("mae_limit", "<=1.0").replace("<=", "")
-    mae_crit = float(mae_crit_str)
-    if results["mae"] > mae_crit:
-        passed = False
-        report_lines.append(f"❌ MAE: {results['mae']:.3%} > limit {mae_crit:.3%}")
-    else:
-        report_lines.append(f"✅ MAE: {results['mae']:.3%} <= limit {mae_crit:.3%}")
-
-    # Trades per day check
-    trades_crit_str = criteria.get("trades_per_day", "<=100").replace("<=", "")
-    trades_crit = float(trades_crit_str)
-    if results["trades_per_day"] > trades_crit:
-        passed = False
-        report_lines.append(f"❌ Trades/Day: {results['trades_per_day']} > limit {trades_crit}")
-    else:
-        report_lines.append(f"✅ Trades/Day: {results['trades_per_day']} <= limit {trades_crit}")
+        report_lines.append(f"⏹️ Backtest stopped early after {evidence['trades']} trades: {evidence['reason']}")
 
     # Final result
     print("\n".join(report_lines))
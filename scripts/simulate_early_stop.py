@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Offline calibration of the sequential early stop (utils/early_stopping.py).
+
+Synthetic runs of `--trades` trades are drawn for true winrates and mean MAEs on both
+sides of the thresholds. Each run is folded trade by trade into TradeMetrics and
+checked by SequentialGate. A stop is wrong if the full run would have met the criterion.
+The script reports the stop rate, the wrong-stop rate and the share of trades saved.
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from graph.utils.gate import compile_criteria
+from utils.backtest_metrics import TradeMetrics
+from utils.early_stopping import DEFAULT_SETTINGS, SequentialGate
+
+CRITERIA = {"sample_out_winrate": ">=0.70", "mae_limit": "<=0.003"}
+# (label, true winrate, true mean MAE); MAE per trade is exponential.
+SCENARIOS = [
+    ("winrate 0.55", 0.55, 0.002),
+    ("winrate 0.65", 0.65, 0.002),
+    ("winrate 0.70", 0.70, 0.002),
+    ("winrate 0.80", 0.80, 0.002),
+    ("mae 0.0040", 0.80, 0.004),
+    ("mae 0.0030", 0.80, 0.003),
+    ("mae 0.0020", 0.80, 0.002),
+]
+
+
+def simulate(winrate: float, mean_mae: float, trades: int, criteria, settings, rng: random.Random):
+    """Returns (stopped, trades used, whether the full run meets every criterion)."""
+    gate = SequentialGate(criteria, trades, settings)
+    metrics = TradeMetrics()
+    stopped_at = None
+    for i in range(trades):
+        pnl = 0.01 if rng.random() < winrate else -0.005
+        metrics.add(pnl, mfe=max(pnl, 0.0), mae=rng.expovariate(1 / mean_mae))
+        if stopped_at is None and gate.check(metrics):
+            stopped_at = i + 1
+    summary = metrics.summary()
+    passes = summary["winrate"] >= 0.70 and summary["mae"] <= 0.003
+    return stopped_at is not None, stopped_at or trades, passes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrates the sequential early stop on synthetic backtests.")
+    parser.add_argument("--runs", type=int, default=2000, help="Runs per scenario")
+    parser.add_argument("--trades", type=int, default=100, help="Planned trades per run")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_SETTINGS["alpha"])
+    parser.add_argument("--min-trades", type=int, default=DEFAULT_SETTINGS["min_trades"])
+    parser.add_argument("--bound", choices=["point", "conservative", "lenient"], default="point")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if wrong stops exceed --max-wrong-stops")
+    parser.add_argument("--max-wrong-stops", type=float, default=0.02, help="With --check: allowed wrong stops per passing run")
+    args = parser.parse_args()
+
+    criteria = compile_criteria(CRITERIA)
+    settings = {"alpha": args.alpha, "min_trades": args.min_trades, "bound": args.bound}
+    rng = random.Random(args.seed)
+
+    print(f"--- Early Stop Simulation ({args.runs} runs x {args.trades} trades, alpha {args.alpha}, {args.bound} bound) ---")
+    print(f"{'scenario':<14} {'full pass':>9} {'stopped':>8} {'wrong':>7} {'trades saved':>13}")
+    wrong_total = passing_total = 0
+    for label, winrate, mean_mae in SCENARIOS:
+        outcomes = [simulate(winrate, mean_mae, args.trades, criteria, settings, rng) for _ in range(args.runs)]
+        passing = sum(passes for _, _, passes in outcomes)
+        stopped = sum(stop for stop, _, _ in outcomes)
+        wrong = sum(stop and passes for stop, _, passes in outcomes)
+        saved = 1 - sum(used for _, used, _ in outcomes) / (args.runs * args.trades)
+        wrong_total += wrong
+        passing_total += passing
+        print(f"{label:<14} {passing / args.runs:>9.1%} {stopped / args.runs:>8.1%} "
+              f"{wrong / max(1, passing):>7.1%} {saved:>13.1%}")
+
+    wrong_rate = wrong_total / max(1, passing_total)
+    if args.check:
+        if wrong_rate > args.max_wrong_stops:
+            print(f"\n[RESULT] ❌ {wrong_rate:.2%} of passing runs were stopped early (> {args.max_wrong_stops:.2%})")
+            sys.exit(1)
+        print(f"\n[RESULT] ✅ Early stop simulation PASSED ({wrong_rate:.2%} of passing runs stopped early)")
+
+
+if __name__ == "__main__":
+    main()
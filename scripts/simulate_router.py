@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Offline simulation of the adaptive model router (graph/utils/model_router.py).
+
+Simulated models have a cost, a latency and a gate-pass rate per task type. Each
+simulated dev iteration is written as the same observability rows a real run logs.
+The rows go through the router's own learning code (`outcomes_from_rows` / `aggregate`).
+The router is compared with static routing and with an oracle that knows the true profiles.
+"""
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from graph.utils.model_router import DEFAULT_SETTINGS, aggregate, choose, classify_task, outcomes_from_rows
+
+# Per-call cost (USD), mean latency (s) and gate-pass rate per task type.
+DEFAULT_PROFILES = {
+    "claude-3-haiku-20240307": {
+        "cost": 0.004, "latency_s": 6.0,
+        "pass": {"indicator": 0.85, "refactor": 0.8, "risk": 0.3, "bugfix": 0.45, "general": 0.75},
+    },
+    "claude-4-sonnet": {
+        "cost": 0.045, "latency_s": 18.0,
+        "pass": {"indicator": 0.9, "refactor": 0.9, "risk": 0.85, "bugfix": 0.85, "general": 0.85},
+    },
+}
+TASKS = {
+    "indicator": "add an RSI filter to the ETH 15m strategy",
+    "refactor": "refactor the signal module",
+    "risk": "add position sizing with a drawdown stop",
+    "bugfix": "fix the crash in the backtest runner",
+    "general": "tune the entry rules",
+}
+
+
+def oracle_model(task_type: str, profiles: dict, min_pass_rate: float, policy: str) -> str:
+    """What the router should converge to, given the true profiles and the cost policy."""
+    feasible = [m for m, p in profiles.items() if p["pass"][task_type] >= min_pass_rate]
+    if policy == "best-quality" or not feasible:
+        return max(profiles, key=lambda m: profiles[m]["pass"][task_type])
+    return min(feasible, key=lambda m: profiles[m]["cost"] * profiles[m]["latency_s"])
+
+
+def simulate_call(model: str, task_type: str, profiles: dict, rng: random.Random):
+    profile = profiles[model]
+    passed = rng.random() < profile["pass"][task_type]
+    cost = profile["cost"] * rng.uniform(0.8, 1.2)
+    latency_ms = profile["latency_s"] * 1000 * rng.lognormvariate(0, 0.25)
+    return passed, cost, latency_ms
+
+
+def merge_stats(stats: dict, new: dict):
+    for key, arm in new.items():
+        total = stats.setdefault(key, {"n": 0, "passes": 0, "cost": 0.0, "latency_ms": 0.0})
+        for field, value in arm.items():
+            total[field] += value
+
+
+def run_policy(policy: str, args, profiles: dict, settings: dict) -> dict:
+    """Runs `args.tasks` tasks under `policy` ("router", "oracle" or a model name)."""
+    rng = random.Random(args.seed)             # tasks and outcomes
+    router_rng = random.Random(args.seed + 1)  # Thompson sampling
+    stats = {}
+    totals = {"calls": 0, "passed_calls": 0, "solved": 0, "cost": 0.0, "latency_s": 0.0, "oracle_agreement": []}
+    shares = {}
+    types = list(TASKS)
+    for task_no in range(args.tasks):
+        task_type = rng.choice(types)
+        task = f"{TASKS[task_type]} #{task_no}"
+        for iteration in range(1, args.max_iterations + 1):
+            if policy == "router":
+                model = choose("dev", classify_task(task, settings["task_types"]), list(profiles), stats,
+                               settings, args.policy, router_rng)["model"]
+            elif policy == "oracle":
+                model = oracle_model(task_type, profiles, settings["min_pass_rate"], args.policy)
+            else:
+                model = policy
+            passed, cost, latency_ms = simulate_call(model, task_type, profiles, rng)
+
+            run_id = f"sim-{task_no}"
+            rows = [
+                {"node_name": "dev", "status": "success", "latency_ms": latency_ms, "cost_usd": cost,
+                 "is_fallback": 0, "run_id": run_id, "iteration": iteration, "model": model, "task": task},
+                {"node_name": "gate", "status": "success" if passed else "fail", "latency_ms": 0.0, "cost_usd": 0.0,
+                 "is_fallback": 0, "run_id": run_id, "iteration": iteration, "model": None, "task": task},
+            ]
+            merge_stats(stats, aggregate(outcomes_from_rows(rows), settings["task_types"]))
+
+            totals["calls"] += 1
+            totals["passed_calls"] += passed
+            totals["cost"] += cost
+            totals["latency_s"] += latency_ms / 1000
+            shares[model] = shares.get(model, 0) + 1
+            if task_no >= args.tasks // 2:
+                totals["oracle_agreement"].append(model == oracle_model(task_type, profiles, settings["min_pass_rate"], args.policy))
+            if passed:
+                totals["solved"] += 1
+                break
+
+    agreement = totals.pop("oracle_agreement")
+    return {
+        **totals,
+        "pass_rate": totals["passed_calls"] / totals["calls"],
+        "solve_rate": totals["solved"] / args.tasks,
+        "cost_per_solved": totals["cost"] / max(1, totals["solved"]),
+        "latency_per_solved_s": totals["latency_s"] / max(1, totals["solved"]),
+        "oracle_agreement_2nd_half": sum(agreement) / max(1, len(agreement)),
+        "model_share": {m: round(c / totals["calls"], 3) for m, c in sorted(shares.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulates the adaptive model router against static routing and an oracle.")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--max-iterations", type=int, default=3, help="Dev -> gate loops per task before giving up")
+    parser.add_argument("--policy", choices=["cheap-first", "best-quality"], default="cheap-first", help="cost_policy.prefer")
+    parser.add_argument("--min-pass-rate", type=float, default=DEFAULT_SETTINGS["min_pass_rate"])
+    parser.add_argument("--profiles", type=Path, help="JSON file with model profiles (see DEFAULT_PROFILES)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-agreement", type=float, default=0.8, help="With --check: required oracle agreement over the second half")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if the router does not converge to the oracle")
+    args = parser.parse_args()
+
+    profiles = json.loads(args.profiles.read_text(encoding="utf-8")) if args.profiles else DEFAULT_PROFILES
+    settings = {**DEFAULT_SETTINGS, "min_pass_rate": args.min_pass_rate}
+
+    print(f"--- Adaptive Router Simulation ({args.tasks} tasks, {args.policy}, min pass rate {args.min_pass_rate:.2f}) ---")
+    results = {policy: run_policy(policy, args, profiles, settings) for policy in ["router", "oracle", *profiles]}
+    print(f"{'policy':<26} {'pass/call':>9} {'solved':>7} {'$/solved':>9} {'s/solved':>9} {'oracle%':>8}  model share")
+    for policy, r in results.items():
+        print(f"{policy:<26} {r['pass_rate']:>9.2f} {r['solve_rate']:>7.2f} {r['cost_per_solved']:>9.4f} "
+              f"{r['latency_per_solved_s']:>9.1f} {r['oracle_agreement_2nd_half']:>8.0%}  {r['model_share']}")
+
+    if args.check:
+        agreement = results["router"]["oracle_agreement_2nd_half"]
+        if agreement < args.min_agreement:
+            print(f"\n[RESULT] ❌ Router agreed with the oracle on {agreement:.0%} of second-half calls (< {args.min_agreement:.0%})")
+            sys.exit(1)
+        print(f"\n[RESULT] ✅ Router simulation PASSED (oracle agreement {agreement:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Run-scoped, atomic artifact store.
+
+Every run writes under `artifacts/runs/<thread_id>/<iteration>/`, so concurrent runs
+never share a path. Files are written to a temp file and renamed into place, and
+their content is stored once under `artifacts/objects/<sha256>` with run paths
+hard-linked to it, so identical artifacts (unchanged task payloads, repeated
+backtests) cost no extra space. Stored files must be replaced, never edited in place.
+
+`promote()` mirrors a finished run into the legacy fixed paths (`artifacts/exec/task.json`,
+`artifacts/backtest/latest.json`, `artifacts/charts/...`) as a `latest` alias for CI
+and scripts that read those; each file is swapped atomically.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+ARTIFACTS_ROOT = Path("artifacts")
+RUNS_DIR = ARTIFACTS_ROOT / "runs"
+OBJECTS_DIR = ARTIFACTS_ROOT / "objects"
+LATEST_POINTER = "latest.json"
+DEFAULT_RETENTION = {"keep_iterations": 5, "max_age_days": 30}
+OBJECT_GRACE_SECONDS = 3600
+
+
+# --- Paths ---
+
+def _safe(name) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", str(name)).strip("-.") or "default"
+
+
+def thread_dir(thread_id: str) -> Path:
+    return RUNS_DIR / _safe(thread_id)
+
+
+def run_dir(thread_id: str, iteration: int) -> Path:
+    """Directory for one iteration of a thread, e.g. artifacts/runs/my-task/003."""
+    return thread_dir(thread_id) / f"{int(iteration):03d}"
+
+
+def latest_run(thread_id: str) -> Optional[Path]:
+    """The run directory most recently promoted for `thread_id`, if any."""
+    try:
+        pointer = read_json(thread_dir(thread_id) / LATEST_POINTER)
+    except FileNotFoundError:
+        return None
+    return Path(pointer["path"])
+
+
+# --- JSON ---
+
+def dumps(obj, indent: bool = True) -> bytes:
+    """
+    Encodes JSON with the json module only, so the bytes (and the deduplicated objects) don't
+    depend on which packages are installed. Non-finite floats are written as Infinity/NaN,
+    which `loads` reads back as floats; a zero-loss profit_factor must stay inf, not null.
+    """
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def loads(data: bytes):
+    return json.loads(data)
+
+
+def read_json(path: Path):
+    return loads(Path(path).read_bytes())
+
+
+# --- Writes ---
+
+def _tmp_path(path: Path, suffix: str = "tmp") -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.{suffix}")
+
+
+def _object_path(digest: str) -> Path:
+    return OBJECTS_DIR / digest[:2] / digest
+
+
+def _link_into_place(obj: Path, path: Path) -> bool:
+    """Atomically points `path` at `obj`. Returns False if `obj` vanished (collected) first."""
+    try:
+        if path.exists() and os.path.samefile(obj, path):
+            return True
+    except FileNotFoundError:
+        return False
+    tmp = _tmp_path(path, "link")
+    try:
+        os.link(obj, tmp)
+    except FileNotFoundError:
+        return False
+    except OSError:
+        # No hard links here (other filesystem, FAT, ...): fall back to a private copy.
+        shutil.copyfile(obj, tmp)
+    os.replace(tmp, path)
+    # rename() is a no-op when both names already point at the same file; drop the spare name.
+    tmp.unlink(missing_ok=True)
+    return True
+
+
+def _ingest(tmp: Path, path: Path, digest: str) -> Path:
+    """Moves a finished temp file into the object store (unless known) and links `path` to it."""
+    obj = _object_path(digest)
+    while True:
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            obj_tmp = _tmp_path(obj)
+            shutil.copyfile(tmp, obj_tmp)
+            os.replace(obj_tmp, obj)
+        if _link_into_place(obj, path):
+            break
+    tmp.unlink(missing_ok=True)
+    return path
+
+
+def write_bytes(path: Path, data: bytes) -> Path:
+    """Atomically writes `data` to `path`, sharing storage with identical content."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256(data).hexdigest()
+    obj = _object_path(digest)
+    if obj.exists() and _link_into_place(obj, path):
+        return path
+    tmp = _tmp_path(path)
+    tmp.write_bytes(data)
+    return _ingest(tmp, path, digest)
+
+
+def write_json(path: Path, obj) -> Path:
+    return write_bytes(path, dumps(obj))
+
+
+def commit_file(tmp: Path, path: Path) -> Path:
+    """Stores a file that was streamed to `tmp` (e.g. a trade log) at `path`, atomically and deduplicated."""
+    tmp, path = Path(tmp), Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    sha = hashlib.sha256()
+    with open(tmp, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return _ingest(tmp, path, sha.hexdigest())
+
+
+def open_for_write(path: Path, mode: str = "w", **kwargs):
+    """Opens a temp file next to `path`; pass it to `commit_file(f.name, path)` once closed."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return open(_tmp_path(path), mode, **kwargs)
+
+
+def _files(root: Path) -> Iterable[Path]:
+    return (p for p in Path(root).rglob("*") if p.is_file() and not p.name.endswith((".tmp", ".link")))
+
+
+def import_tree(source: Path, dest: Path) -> int:
+    """
+    Copies every file under the artifacts root `source` into `dest` through the store.
+    The source's own object store is skipped; its files arrive through the run paths.
+    Returns the file count.
+    """
+    count = 0
+    for src in _files(source):
+        relative = src.relative_to(source)
+        if relative.parts[0] == OBJECTS_DIR.name:
+            continue
+        target = Path(dest) / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = _tmp_path(target)
+        shutil.copyfile(src, tmp)
+        commit_file(tmp, target)
+        count += 1
+    return count
+
+
+def promote(run: Path, thread_id: str, iteration: int):
+    """Makes `run` the `latest` run of its thread and mirrors it into the legacy artifact paths."""
+    run = Path(run)
+    for src in _files(run):
+        target = ARTIFACTS_ROOT / src.relative_to(run)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        _link_into_place(src, target)
+    write_json(thread_dir(thread_id) / LATEST_POINTER, {"iteration": iteration, "path": str(run), "promoted_at": time.time()})
+
+
+# --- Retention ---
+
+def compact(keep_iterations: int = DEFAULT_RETENTION["keep_iterations"],
+            max_age_days: float = DEFAULT_RETENTION["max_age_days"],
+            grace_seconds: float = OBJECT_GRACE_SECONDS) -> Tuple[int, int]:
+    """
+    Applies the retention policy: keeps the newest `keep_iterations` runs per thread,
+    drops threads untouched for `max_age_days`, then deletes stored objects no run
+    links to any more. Returns (runs removed, objects removed).
+    """
+    removed_runs = 0
+    now = time.time()
+    if RUNS_DIR.exists():
+        for thread in [d for d in RUNS_DIR.iterdir() if d.is_dir()]:
+            runs = sorted((d for d in thread.iterdir() if d.is_dir()), key=lambda d: d.stat().st_mtime)
+            newest = max((d.stat().st_mtime for d in runs), default=thread.stat().st_mtime)
+            expired = now - newest > max_age_days * 86_400
+            latest = latest_run(thread.name)
+            doomed = runs if expired else [
+                run for run in runs[:max(0, len(runs) - keep_iterations)]
+                if latest is None or run.resolve() != latest.resolve()
+            ]
+            for run in doomed:
+                shutil.rmtree(run, ignore_errors=True)
+                removed_runs += 1
+            if expired:
+                shutil.rmtree(thread, ignore_errors=True)
+
+    # An object whose only remaining link is its own store entry is garbage.
+    removed_objects = 0
+    if OBJECTS_DIR.exists():
+        for obj in _files(OBJECTS_DIR):
+            stat = obj.stat()
+            if stat.st_nlink <= 1 and now - stat.st_mtime > grace_seconds:
+                obj.unlink(missing_ok=True)
+                removed_objects += 1
+    return removed_runs, removed_objects
+
+
+def get_retention(spec: Dict) -> Dict:
+    """Reads `artifacts.retention` from the spec, filling in defaults."""
+    retention = dict(DEFAULT_RETENTION)
+    retention.update((spec.get("artifacts") or {}).get("retention") or {})
+    return retention
@@ -0,0 +1,189 @@
+"""
+Single-pass backtest metrics.
+
+`TradeMetrics` folds trades in one at a time with O(1) work and memory per trade
+(Welford updates for means and variances, running prefix sums for drawdown), so a
+sweep producing millions of trades never has to materialize them. Accumulators for
+consecutive slices of a run can be computed in parallel and merged in time order.
+"""
+import math
+from datetime import datetime
+from typing import Dict, Optional
+
+SECONDS_PER_DAY = 86_400.0
+DAYS_PER_YEAR = 365.0  # crypto markets trade every day
+
+
+class _Moments:
+    """Running count, mean and sum of squared deviations (Welford / Chan et al.)."""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other: "_Moments"):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (0 for fewer than two values)."""
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+def _timestamp(value) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    # A zero denominator is the best (or worst) case rather than a missing value, e.g. no losing trades.
+    if denominator > 0:
+        return numerator / denominator
+    if numerator == 0:
+        return None
+    return math.inf if numerator > 0 else -math.inf
+
+
+class TradeMetrics:
+    """
+    Streaming accumulator for per-trade results.
+
+    `pnl`, `mfe` and `mae` are returns as fractions of the position (0.01 = 1%).
+    Drawdown is measured on the cumulative sum of trade returns, in the order trades
+    are added; `merge()` therefore expects `other` to cover the period after `self`.
+    """
+
+    def __init__(self):
+        self.pnl = _Moments()
+        self.mfe = _Moments()
+        self.mae = _Moments()
+        self.wins = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.downside_sq = 0.0      # sum of min(pnl, 0)^2, for the Sortino ratio
+        self.cum_pnl = 0.0          # running sum of returns
+        self.max_prefix = 0.0       # highest cumulative return seen (the start counts as 0)
+        self.min_prefix = 0.0       # lowest cumulative return seen
+        self.max_drawdown = 0.0
+        self.time_in_market = 0.0   # seconds
+        self.first_entry: Optional[float] = None
+        self.last_exit: Optional[float] = None
+
+    def add(self, pnl: float, mfe: float = 0.0, mae: float = 0.0, entry_time=None, exit_time=None):
+        """Folds in one trade. Times may be datetimes, ISO strings or epoch seconds."""
+        self.pnl.add(pnl)
+        self.mfe.add(mfe)
+        self.mae.add(mae)
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+        else:
+            self.gross_loss -= pnl
+            self.downside_sq += pnl * pnl
+
+        self.cum_pnl += pnl
+        self.max_prefix = max(self.max_prefix, self.cum_pnl)
+        self.min_prefix = min(self.min_prefix, self.cum_pnl)
+        self.max_drawdown = max(self.max_drawdown, self.max_prefix - self.cum_pnl)
+
+        entry, exit_ = _timestamp(entry_time), _timestamp(exit_time)
+        if entry is not None:
+            exit_ = entry if exit_ is None else exit_
+            self.time_in_market += max(0.0, exit_ - entry)
+            self.first_entry = entry if self.first_entry is None else min(self.first_entry, entry)
+            self.last_exit = exit_ if self.last_exit is None else max(self.last_exit, exit_)
+
+    def merge(self, other: "TradeMetrics") -> "TradeMetrics":
+        """Merges the accumulator of the slice that directly follows this one, in place."""
+        # A drawdown may start at this slice's peak and bottom out inside the next one.
+        cross_drawdown = self.max_prefix - (self.cum_pnl + other.min_prefix)
+        self.max_drawdown = max(self.max_drawdown, other.max_drawdown, cross_drawdown)
+        self.max_prefix = max(self.max_prefix, self.cum_pnl + other.max_prefix)
+        self.min_prefix = min(self.min_prefix, self.cum_pnl + other.min_prefix)
+        self.cum_pnl += other.cum_pnl
+
+        self.pnl.merge(other.pnl)
+        self.mfe.merge(other.mfe)
+        self.mae.merge(other.mae)
+        self.wins += other.wins
+        self.gross_profit += other.gross_profit
+        self.gross_loss += other.gross_loss
+        self.downside_sq += other.downside_sq
+        self.time_in_market += other.time_in_market
+        for attr, pick in (("first_entry", min), ("last_exit", max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            setattr(self, attr, theirs if mine is None else mine if theirs is None else pick(mine, theirs))
+        return self
+
+    @property
+    def count(self) -> int:
+        return self.pnl.n
+
+    def span_days(self) -> float:
+        """Fractional days between the first entry and the last exit."""
+        if self.first_entry is None:
+            return 0.0
+        return (self.last_exit - self.first_entry) / SECONDS_PER_DAY
+
+    def summary(self) -> Dict:
+        """
+        The metrics a gate can reference, keyed by name. A ratio with a zero denominator is
+        +/-inf (no losing trades, zero variance) and None only when it is 0/0.
+        """
+        n = self.count
+        span = self.span_days()
+        # A run shorter than its trades' resolution still covers at least the trades themselves.
+        trades_per_day = n / span if span > 0 else float(n)
+        periods_per_year = trades_per_day * DAYS_PER_YEAR
+
+        std = self.pnl.std
+        downside_dev = math.sqrt(self.downside_sq / n) if n else 0.0
+        annualize = math.sqrt(periods_per_year)
+        return {
+            "num_trades": n,
+            "winrate": self.wins / n if n else 0.0,
+            "mfe": self.mfe.mean,
+            "mae": self.mae.mean,
+            "trades_per_day": trades_per_day,
+            "pnl_mean": self.pnl.mean,
+            "pnl_std": std,
+            "total_return": self.cum_pnl,
+            "max_drawdown": self.max_drawdown,
+            "sharpe": _ratio(self.pnl.mean * annualize, std),
+            "sortino": _ratio(self.pnl.mean * annualize, downside_dev),
+            "profit_factor": _ratio(self.gross_profit, self.gross_loss),
+            "exposure": min(1.0, self.time_in_market / (span * SECONDS_PER_DAY)) if span > 0 else 0.0,
+        }
+
+    def to_dict(self) -> Dict:
+        """Serializable state, e.g. for returning a shard's accumulator from a worker process."""
+        state = {k: v for k, v in self.__dict__.items() if not isinstance(v, _Moments)}
+        for name in ("pnl", "mfe", "mae"):
+            moments = getattr(self, name)
+            state[name] = [moments.n, moments.mean, moments.m2]
+        return state
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> "TradeMetrics":
+        metrics = cls()
+        for key, value in state.items():
+            setattr(metrics, key, _Moments(*value) if key in ("pnl", "mfe", "mae") else value)
+        return metrics
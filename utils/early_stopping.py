@@ -0,0 +1,158 @@
+"""
+Sequential early stopping for backtests against the compiled acceptance criteria.
+
+Most candidates in sweeps and correction loops are clear failures, so the backtester can
+stop as soon as a gate metric cannot recover instead of simulating the full history.
+After every trade each criterion is tested in two ways:
+
+- unreachable: the threshold is out of reach even if every remaining planned trade is
+  as favourable as possible (winrate, mean MAE/MFE against an upper limit), or the metric
+  never improves (max_drawdown);
+- confidence sequence: a time-uniform normal-mixture confidence sequence for a per-trade
+  mean (winrate, mfe, mae, pnl_mean) lies entirely on the failing side. Because it holds
+  at every trade count at once, checking after every trade does not inflate the
+  false-stop rate beyond `alpha`. Winrate uses the Bernoulli variance bound (std <= 0.5),
+  so its sequence is anytime-valid. The other means use the sample std, floored at
+  MIN_STD_RATIO x |threshold|, so theirs is only asymptotically valid.
+
+Under `acceptance.confidence.bound: lenient` the gate accepts a metric whose final interval
+still reaches the threshold, so that interval's half-width is added as a margin.
+Other metrics (sharpe, trades_per_day, ...) never stop a run early.
+"""
+import math
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+from utils.resampling import get_confidence_settings
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "alpha": 0.01,
+    "min_trades": 30,
+}
+# Per-trade means and the range a single trade's value can take.
+MEAN_METRICS = {
+    "winrate": (0.0, 1.0),
+    "mfe": (0.0, math.inf),
+    "mae": (0.0, math.inf),
+    "pnl_mean": (-math.inf, math.inf),
+}
+# The mixture is tuned for this run length when the planned length is unknown.
+DEFAULT_TUNED_FOR = 100
+# Metrics that can only grow as trades are added.
+NON_DECREASING = ("max_drawdown",)
+# Floor for the plug-in std of unbounded means, relative to the threshold, so a run of
+# identical trades doesn't shrink the sequence to its point estimate.
+MIN_STD_RATIO = 0.5
+_FAILS = {
+    ">=": lambda value, threshold: value < threshold,
+    ">": lambda value, threshold: value <= threshold,
+    "<=": lambda value, threshold: value > threshold,
+    "<": lambda value, threshold: value >= threshold,
+}
+
+
+def get_early_stop_settings(spec: dict) -> dict:
+    """Reads `acceptance.early_stop`, plus the gate's confidence bound and level."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(spec.get("acceptance", {}).get("early_stop", {}) or {})
+    confidence = get_confidence_settings(spec)
+    settings["bound"] = confidence["bound"] if confidence["enabled"] else "point"
+    settings["level"] = float(confidence["level"])
+    return settings
+
+
+def confidence_radius(std: float, n: int, alpha: float, tuned_for: int) -> float:
+    """
+    Half-width of the normal-mixture confidence sequence after `n` observations
+    (Waudby-Smith et al., 2021). The mixture is tuned to be tightest around `tuned_for`.
+    """
+    log_term = -2 * math.log(alpha)
+    rho2 = (log_term + math.log(log_term + 1)) / max(1, tuned_for)
+    return std * math.sqrt(2 * (n * rho2 + 1) / (n * n * rho2) * math.log(math.sqrt(n * rho2 + 1) / alpha))
+
+
+def _mean_and_std(metrics, metric: str):
+    if metric == "winrate":
+        return metrics.wins / metrics.count, 0.5
+    moments = {"mfe": metrics.mfe, "mae": metrics.mae, "pnl_mean": metrics.pnl}[metric]
+    return moments.mean, moments.std
+
+
+class SequentialGate:
+    """
+    Decides after each trade whether a criterion has already failed for good.
+    `criteria` is graph.utils.gate.compile_criteria() output; `planned_trades` is the
+    length of the full run, if known.
+    """
+
+    def __init__(self, criteria: List[Dict], planned_trades: Optional[int] = None, settings: Optional[Dict] = None):
+        self.settings = {**DEFAULT_SETTINGS, "bound": "point", "level": 0.95, **(settings or {})}
+        self.criteria = [c for c in criteria if c["op"] in _FAILS and (c["metric"] in MEAN_METRICS or c["metric"] in NON_DECREASING)]
+        self.planned_trades = planned_trades
+        self.alpha = float(self.settings["alpha"])
+        self.min_trades = int(self.settings["min_trades"])
+        self._z = NormalDist().inv_cdf(1 - (1 - float(self.settings["level"])) / 2)
+
+    def check(self, metrics) -> Optional[Dict]:
+        """Evidence for the first criterion that can no longer pass, or None to keep going."""
+        n = metrics.count
+        if n < self.min_trades:
+            return None
+        for criterion in self.criteria:
+            evidence = self._unreachable(metrics, criterion) or self._sequential_test(metrics, criterion)
+            if evidence:
+                return {
+                    "key": criterion["key"],
+                    "metric": criterion["metric"],
+                    "op": criterion["op"],
+                    "threshold": criterion["threshold"],
+                    "trades": n,
+                    "planned_trades": self.planned_trades,
+                    **evidence,
+                }
+        return None
+
+    def _unreachable(self, metrics, criterion: Dict) -> Optional[Dict]:
+        metric, op, threshold = criterion["metric"], criterion["op"], criterion["threshold"]
+        fails = _FAILS[op]
+        if metric in NON_DECREASING:
+            value = getattr(metrics, metric)
+            if op in ("<=", "<") and fails(value, threshold):
+                return {"test": "unreachable", "estimate": value, "best_case": value,
+                        "reason": f"{metric} is already {value:.4g} and can only grow"}
+            return None
+        if not self.planned_trades or self.planned_trades <= metrics.count:
+            return None
+        low, high = MEAN_METRICS[metric]
+        best_value = high if op in (">=", ">") else low
+        if math.isinf(best_value):
+            return None
+        mean, _ = _mean_and_std(metrics, metric)
+        remaining = self.planned_trades - metrics.count
+        best_case = (mean * metrics.count + best_value * remaining) / self.planned_trades
+        if fails(best_case, threshold):
+            return {"test": "unreachable", "estimate": mean, "best_case": best_case,
+                    "reason": f"even if the remaining {remaining} trades are all at {best_value:g}, {metric} ends at {best_case:.4g}"}
+        return None
+
+    def _sequential_test(self, metrics, criterion: Dict) -> Optional[Dict]:
+        metric, op, threshold = criterion["metric"], criterion["op"], criterion["threshold"]
+        if metric not in MEAN_METRICS:
+            return None
+        n = metrics.count
+        mean, std = _mean_and_std(metrics, metric)
+        std = max(std, MIN_STD_RATIO * abs(threshold))
+        if std == 0:
+            # No spread and a zero threshold: nothing to base a sequence on.
+            return None
+        radius = confidence_radius(std, n, self.alpha, self.planned_trades or DEFAULT_TUNED_FOR)
+        if self.settings["bound"] == "lenient":
+            radius += self._z * std / math.sqrt(self.planned_trades or n)
+        # The end of the sequence most favourable to the criterion.
+        favourable = mean + radius if op in (">=", ">") else mean - radius
+        if not _FAILS[op](favourable, threshold):
+            return None
+        return {"test": "confidence_sequence", "estimate": mean, "favourable_bound": favourable, "alpha": self.alpha,
+                "reason": f"{metric} is {mean:.4g}; its {1 - self.alpha:.0%} confidence sequence ends at "
+                          f"{favourable:.4g}, which cannot satisfy {op}{threshold:g}"}
@@ -0,0 +1,289 @@
+"""
+Rolling indicators for the trading_p1ns strategy modules.
+
+Every indicator comes in two forms that produce the same values:
+
+- a batch function (`rolling_mean`, `atr`, ...) over NumPy arrays, vectorized with
+  sliding-window views, for backtests over full histories;
+- a streaming class (`RollingMean`, `ATR`, ...) whose `update()` folds in one bar with
+  O(1) work and memory, for live trading where a bar arrives at a time.
+
+Values are NaN until the window is full, in both forms.
+`scripts/check_indicator_parity.py` checks that both forms agree.
+"""
+import math
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+
+NAN = float("nan")
+# Sliding-window reductions are done in chunks of at most this many cells to bound memory.
+MAX_CELLS_PER_CHUNK = 5_000_000
+
+
+def _as_array(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def _padded(values: np.ndarray, n: int) -> np.ndarray:
+    """Left-pads a windowed result with NaN back to length `n`."""
+    out = np.full(n, np.nan)
+    if len(values):
+        out[n - len(values):] = values
+    return out
+
+
+def _windowed(values, window: int, reduce) -> np.ndarray:
+    """Applies `reduce(windows)` to every full window of `values`, in bounded-memory chunks."""
+    x = _as_array(values)
+    if len(x) < window:
+        return np.full(len(x), np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(x, window)
+    step = max(1, MAX_CELLS_PER_CHUNK // window)
+    return _padded(np.concatenate([reduce(windows[i:i + step]) for i in range(0, len(windows), step)]), len(x))
+
+
+# --- Rolling Mean / Std ---
+
+# Running sums drift when the level moves far more than the window varies (prices over a
+# long history). Batch results are therefore reduced per window, and streaming state is
+# re-summed from the window once every `window` updates (still amortized O(1) per bar).
+
+def rolling_mean(values, window: int) -> np.ndarray:
+    return _windowed(values, window, lambda w: w.mean(axis=1))
+
+
+def rolling_std(values, window: int, ddof: int = 0) -> np.ndarray:
+    if window <= ddof:
+        return np.full(len(values), np.nan)
+    return _windowed(values, window, lambda w: w.std(axis=1, ddof=ddof))
+
+
+class RollingMean:
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.updates = 0
+
+    def update(self, x: float) -> float:
+        self.values.append(x)
+        self.total += x
+        if len(self.values) > self.window:
+            self.total -= self.values.popleft()
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self.total = math.fsum(self.values)
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self.total / self.window if len(self.values) == self.window else NAN
+
+
+class RollingStd:
+    """Windowed Welford update: replacing the oldest value adjusts mean and M2 in O(1)."""
+
+    def __init__(self, window: int, ddof: int = 0):
+        self.window, self.ddof = window, ddof
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def update(self, x: float) -> float:
+        self.values.append(x)
+        if len(self.values) <= self.window:
+            delta = x - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (x - self.mean)
+        else:
+            old = self.values.popleft()
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+            self.updates += 1
+            if self.updates % self.window == 0:
+                self.mean = math.fsum(self.values) / self.window
+                self.m2 = math.fsum((v - self.mean) ** 2 for v in self.values)
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if len(self.values) < self.window or self.window <= self.ddof:
+            return NAN
+        return math.sqrt(max(self.m2, 0.0) / (self.window - self.ddof))
+
+
+# --- Rolling Highs / Lows ---
+
+def rolling_max(values, window: int) -> np.ndarray:
+    return _windowed(values, window, lambda w: w.max(axis=1))
+
+
+def rolling_min(values, window: int) -> np.ndarray:
+    return _windowed(values, window, lambda w: w.min(axis=1))
+
+
+class RollingMax:
+    """
+    Monotonic deque of (index, value) with decreasing values: the front is the window
+    maximum, and each value is pushed and popped at most once (amortized O(1) per bar).
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.candidates = deque()
+        self.count = 0
+
+    def _beats(self, new: float, old: float) -> bool:
+        return new >= old
+
+    def update(self, x: float) -> float:
+        while self.candidates and self._beats(x, self.candidates[-1][1]):
+            self.candidates.pop()
+        self.candidates.append((self.count, x))
+        self.count += 1
+        if self.candidates[0][0] <= self.count - 1 - self.window:
+            self.candidates.popleft()
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self.candidates[0][1] if self.count >= self.window else NAN
+
+
+class RollingMin(RollingMax):
+    """Monotonic deque with increasing values; the front is the window minimum."""
+
+    def _beats(self, new: float, old: float) -> bool:
+        return new <= old
+
+
+# --- ATR ---
+
+def true_range(high, low, close) -> np.ndarray:
+    """max(high - low, |high - prev close|, |low - prev close|); the first bar uses high - low."""
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    ranges = np.vstack((high - low, np.abs(high - prev_close), np.abs(low - prev_close)))
+    return np.nanmax(ranges, axis=0) if len(high) else high
+
+
+def atr(high, low, close, window: int = 14) -> np.ndarray:
+    """Average true range as a simple moving average of the true range."""
+    return rolling_mean(true_range(high, low, close), window)
+
+
+class ATR:
+    def __init__(self, window: int = 14):
+        self.mean = RollingMean(window)
+        self.prev_close: Optional[float] = None
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        return self.mean.update(tr)
+
+    @property
+    def value(self) -> float:
+        return self.mean.value
+
+
+# --- Fair Value Gaps ---
+
+def fair_value_gaps(high, low) -> Dict[str, np.ndarray]:
+    """
+    Three-bar fair value gaps, marked on the third bar. A bullish gap is left when bar i's
+    low is above bar i-2's high, a bearish one when bar i's high is below bar i-2's low.
+    Returns boolean `bullish`/`bearish` arrays and the gap `top`/`bottom` (NaN where none).
+    """
+    high, low = _as_array(high), _as_array(low)
+    n = len(high)
+    bullish, bearish = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+    top, bottom = np.full(n, np.nan), np.full(n, np.nan)
+    if n >= 3:
+        bullish[2:] = low[2:] > high[:-2]
+        bearish[2:] = high[2:] < low[:-2]
+        prev_high, prev_low = np.concatenate(([np.nan] * 2, high[:-2])), np.concatenate(([np.nan] * 2, low[:-2]))
+        top = np.where(bullish, low, np.where(bearish, prev_low, np.nan))
+        bottom = np.where(bullish, prev_high, np.where(bearish, high, np.nan))
+    return {"bullish": bullish, "bearish": bearish, "top": top, "bottom": bottom}
+
+
+class FairValueGaps:
+    def __init__(self):
+        self.bars = deque(maxlen=3)
+
+    def update(self, high: float, low: float) -> Dict:
+        """Returns {"bullish", "bearish", "top", "bottom"} for the bar just added."""
+        self.bars.append((high, low))
+        gap = {"bullish": False, "bearish": False, "top": NAN, "bottom": NAN}
+        if len(self.bars) == 3:
+            first_high, first_low = self.bars[0]
+            if low > first_high:
+                gap.update(bullish=True, top=low, bottom=first_high)
+            elif high < first_low:
+                gap.update(bearish=True, top=first_low, bottom=high)
+        return gap
+
+
+# --- Regime Features ---
+
+def regime_features(high, low, close, fast: int = 20, slow: int = 100, atr_window: int = 14) -> Dict[str, np.ndarray]:
+    """
+    Inputs for the Regime module, per bar:
+    - `zscore`: distance of close from its `slow` mean, in `slow` standard deviations (trend strength)
+    - `vol_ratio`: `fast` / `slow` standard deviation of close-to-close returns (volatility expansion > 1)
+    - `atr_pct`: ATR as a fraction of close
+    - `range_pos`: where close sits in the `slow`-bar high/low range (0 = at the low, 1 = at the high)
+    """
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    returns = np.concatenate(([0.0], np.diff(close) / close[:-1])) if len(close) else close
+    mean, std = rolling_mean(close, slow), rolling_std(close, slow)
+    fast_vol, slow_vol = rolling_std(returns, fast), rolling_std(returns, slow)
+    hh, ll = rolling_max(high, slow), rolling_min(low, slow)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "zscore": _ratio(close - mean, std, flat=0.0),
+            "vol_ratio": _ratio(fast_vol, slow_vol, flat=np.nan),
+            "atr_pct": atr(high, low, close, atr_window) / close,
+            "range_pos": _ratio(close - ll, hh - ll, flat=0.5),
+        }
+
+
+def _ratio(num: np.ndarray, den: np.ndarray, flat: float) -> np.ndarray:
+    """num / den, `flat` where den is 0 and NaN while the window is still filling."""
+    return np.where(np.isnan(den), np.nan, np.where(den > 0, num / den, flat))
+
+
+class RegimeFeatures:
+    def __init__(self, fast: int = 20, slow: int = 100, atr_window: int = 14):
+        self.mean, self.std = RollingMean(slow), RollingStd(slow)
+        self.fast_vol, self.slow_vol = RollingStd(fast), RollingStd(slow)
+        self.high, self.low = RollingMax(slow), RollingMin(slow)
+        self.atr = ATR(atr_window)
+        self.prev_close: Optional[float] = None
+
+    def update(self, high: float, low: float, close: float) -> Dict[str, float]:
+        ret = 0.0 if self.prev_close is None else (close - self.prev_close) / self.prev_close
+        self.prev_close = close
+        mean, std = self.mean.update(close), self.std.update(close)
+        fast_vol, slow_vol = self.fast_vol.update(ret), self.slow_vol.update(ret)
+        hh, ll = self.high.update(high), self.low.update(low)
+        atr_value = self.atr.update(high, low, close)
+        return {
+            "zscore": _scalar_ratio(close - mean, std, flat=0.0),
+            "vol_ratio": _scalar_ratio(fast_vol, slow_vol, flat=NAN),
+            "atr_pct": atr_value / close,
+            "range_pos": _scalar_ratio(close - ll, hh - ll, flat=0.5),
+        }
+
+
+def _scalar_ratio(num: float, den: float, flat: float) -> float:
+    if math.isnan(den):
+        return NAN
+    return num / den if den > 0 else flat
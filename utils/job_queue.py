@@ -0,0 +1,363 @@
+"""
+Durable SQLite-backed job queue for draining the task backlog with many workers.
+
+Jobs are keyed by `thread_id`, so enqueueing the same thread twice is a no-op.
+Workers claim a job with a time-limited lease and renew it with heartbeats; if a
+worker dies its lease expires and the job is handed to another worker, up to
+`max_attempts` times. Point VIBE_QUEUE_DB at a shared location to let workers on
+several machines drain one queue (the filesystem must support SQLite locking).
+
+Batch mode (graph/batch.py) holds queued jobs as `batched` while their prompts go
+through a provider batch, and records the results as the initial graph state of
+each job's thread; workers pass that state on to the handler.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from utils.observability import log_queue_metric
+
+QUEUE_DB = Path(os.getenv("VIBE_QUEUE_DB", "artifacts/queue/jobs.db"))
+DEFAULT_LEASE_S = 300
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_S = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    thread_id TEXT NOT NULL UNIQUE,
+    task TEXT NOT NULL,
+    fanout INTEGER,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, enqueued_at);
+CREATE TABLE IF NOT EXISTS job_state (
+    thread_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def connect(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    """Opens the queue database (creating it if needed) in WAL mode for concurrent workers."""
+    path = Path(db_path or QUEUE_DB)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def enqueue(conn: sqlite3.Connection, task: str, thread_id: str, fanout: Optional[int] = None,
+            max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Dict:
+    """
+    Adds a task to the queue. Idempotent on `thread_id`: an existing job is returned
+    unchanged with `created` set to False.
+    """
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO jobs (thread_id, task, fanout, max_attempts, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+        (thread_id, task, fanout, max_attempts, time.time())
+    )
+    job = dict(conn.execute("SELECT * FROM jobs WHERE thread_id = ?", (thread_id,)).fetchone())
+    job["created"] = cursor.rowcount == 1
+    if job["created"]:
+        counts = depth(conn)
+        log_queue_metric("enqueue", thread_id, "", counts["queued"], counts["running"])
+    return job
+
+
+def _expire_leases(conn: sqlite3.Connection, now: float):
+    """Requeues jobs whose worker stopped heartbeating, or fails them once out of attempts."""
+    conn.execute(
+        "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires_at = NULL "
+        "WHERE status = 'running' AND lease_expires_at < ? AND attempts < max_attempts",
+        (now,)
+    )
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Lease expired after the final attempt' "
+        "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts",
+        (now, now)
+    )
+    conn.execute("DELETE FROM job_state WHERE thread_id IN (SELECT thread_id FROM jobs WHERE status = 'failed')")
+
+
+def claim(conn: sqlite3.Connection, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> Optional[Dict]:
+    """Atomically claims the oldest queued job for `worker_id`, or returns None if the queue is empty."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _expire_leases(conn, now)
+        row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY enqueued_at, id LIMIT 1").fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker_id = ?, attempts = attempts + 1, "
+            "lease_expires_at = ?, started_at = ? WHERE id = ?",
+            (worker_id, now + lease_s, now, row["id"])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    job = dict(row)
+    job.update(status="running", worker_id=worker_id, attempts=row["attempts"] + 1, started_at=now)
+    return job
+
+
+def heartbeat(conn: sqlite3.Connection, job_id: int, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> bool:
+    """Extends the lease on a running job. Returns False if the worker no longer owns it."""
+    cursor = conn.execute(
+        "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+        (time.time() + lease_s, job_id, worker_id)
+    )
+    return cursor.rowcount == 1
+
+
+def _clear_initial_state(conn: sqlite3.Connection, job_id: int):
+    # A finished job's thread is never run again, so its batch results are no longer needed.
+    conn.execute("DELETE FROM job_state WHERE thread_id = (SELECT thread_id FROM jobs WHERE id = ?)", (job_id,))
+
+
+def complete(conn: sqlite3.Connection, job_id: int, worker_id: str, result: Dict) -> bool:
+    """Marks a job done with its (JSON-serializable) result and drops its initial state."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, result = ?, lease_expires_at = NULL "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (time.time(), json.dumps(result, ensure_ascii=False, default=str), job_id, worker_id)
+        )
+        if cursor.rowcount == 1:
+            _clear_initial_state(conn, job_id)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return cursor.rowcount == 1
+
+
+def fail(conn: sqlite3.Connection, job_id: int, worker_id: str, error: str) -> str:
+    """
+    Records a failed attempt. The job is requeued unless it is out of attempts, in which
+    case its initial state is dropped; returns the new status, or "lost_lease" if another
+    worker has taken the job over since.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+            "worker_id = NULL, lease_expires_at = NULL, error = ?, "
+            "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (error, time.time(), job_id, worker_id)
+        )
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if cursor.rowcount == 1 and row["status"] == "failed":
+            _clear_initial_state(conn, job_id)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if cursor.rowcount != 1:
+        return "lost_lease"
+    return row["status"]
+
+
+def depth(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Number of jobs per status."""
+    counts = {"queued": 0, "batched": 0, "running": 0, "done": 0, "failed": 0}
+    for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+        counts[row["status"]] = row["n"]
+    return counts
+
+
+# --- Batch Mode ---
+
+def hold(conn: sqlite3.Connection, limit: int) -> List[Dict]:
+    """
+    Atomically moves up to `limit` of the oldest queued jobs to `batched`, so no worker
+    claims them. Jobs that already have initial state were batched before and are skipped.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND thread_id NOT IN (SELECT thread_id FROM job_state) "
+            "ORDER BY enqueued_at, id LIMIT ?", (limit,)
+        ).fetchall()
+        conn.executemany("UPDATE jobs SET status = 'batched' WHERE id = ?", [(row["id"],) for row in rows])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return [{**dict(row), "status": "batched"} for row in rows]
+
+
+def release(conn: sqlite3.Connection, thread_id: str) -> bool:
+    """Hands a held job back to the workers."""
+    cursor = conn.execute("UPDATE jobs SET status = 'queued' WHERE thread_id = ? AND status = 'batched'", (thread_id,))
+    return cursor.rowcount == 1
+
+
+def get_initial_state(conn: sqlite3.Connection, thread_id: str) -> Optional[Dict]:
+    """Graph state fields recorded for `thread_id` before its run, if any."""
+    row = conn.execute("SELECT state FROM job_state WHERE thread_id = ?", (thread_id,)).fetchone()
+    return json.loads(row["state"]) if row else None
+
+
+def update_initial_state(conn: sqlite3.Connection, thread_id: str, fields: Dict):
+    """Merges `fields` into the initial graph state of `thread_id`."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        state = get_initial_state(conn, thread_id) or {}
+        state.update(fields)
+        conn.execute(
+            "INSERT OR REPLACE INTO job_state (thread_id, state, updated_at) VALUES (?, ?, ?)",
+            (thread_id, json.dumps(state, ensure_ascii=False), time.time())
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# --- Workers ---
+
+def _heartbeat_loop(db_path: Path, job_id: int, worker_id: str, lease_s: float, stop: threading.Event):
+    """Renews the lease every third of its length until `stop` is set."""
+    conn = connect(db_path)
+    try:
+        while not stop.wait(lease_s / 3):
+            if not heartbeat(conn, job_id, worker_id, lease_s):
+                print(f"⚠️ [{worker_id}] Lost the lease on job {job_id}; another worker may retry it.")
+                return
+    finally:
+        conn.close()
+
+
+def process_one(conn: sqlite3.Connection, handler: Callable, worker_id: str, db_path: Path = None,
+                lease_s: float = DEFAULT_LEASE_S) -> bool:
+    """
+    Claims one job and runs `handler(task, thread_id, fanout)` on it while heartbeating,
+    adding `initial_state=` when batch mode recorded state for the thread.
+    Returns False if there was nothing to claim.
+    """
+    job = claim(conn, worker_id, lease_s)
+    if job is None:
+        return False
+
+    counts = depth(conn)
+    wait_ms = (job["started_at"] - job["enqueued_at"]) * 1000
+    log_queue_metric("claim", job["thread_id"], worker_id, counts["queued"], counts["running"],
+                     wait_ms=wait_ms, attempts=job["attempts"])
+    print(f"▶️ [{worker_id}] Job {job['id']} ({job['thread_id']}), attempt {job['attempts']}/{job['max_attempts']}, waited {wait_ms / 1000:.1f}s")
+
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat_loop, args=(db_path or QUEUE_DB, job["id"], worker_id, lease_s, stop), daemon=True)
+    beat.start()
+    start = time.time()
+    initial_state = get_initial_state(conn, job["thread_id"])
+    try:
+        if initial_state:
+            result = handler(job["task"], job["thread_id"], job["fanout"], initial_state=initial_state)
+        else:
+            result = handler(job["task"], job["thread_id"], job["fanout"])
+    except Exception as e:
+        event = fail(conn, job["id"], worker_id, f"{type(e).__name__}: {e}")
+        print(f"❌ [{worker_id}] Job {job['id']} raised {type(e).__name__}: {e} -> {event}")
+        event = {"queued": "retry", "lost_lease": "lost_lease"}.get(event, "fail")
+    except KeyboardInterrupt:
+        # Hand the job back right away instead of waiting for the lease to expire.
+        fail(conn, job["id"], worker_id, "Interrupted")
+        raise
+    else:
+        if complete(conn, job["id"], worker_id, result):
+            print(f"✅ [{worker_id}] Job {job['id']} done in {time.time() - start:.1f}s")
+            event = "complete"
+        else:
+            # The lease expired mid-run and the job was requeued or claimed by another worker,
+            # so this result is discarded.
+            print(f"⚠️ [{worker_id}] Job {job['id']} finished after its lease was lost; the result was not recorded.")
+            event = "lost_lease"
+    finally:
+        stop.set()
+        beat.join()
+
+    counts = depth(conn)
+    log_queue_metric(event, job["thread_id"], worker_id, counts["queued"], counts["running"],
+                     run_ms=(time.time() - start) * 1000, attempts=job["attempts"])
+    return True
+
+
+def worker_loop(handler: Callable, worker_id: str, db_path: Path = None, lease_s: float = DEFAULT_LEASE_S,
+                poll_s: float = DEFAULT_POLL_S, exit_when_empty: bool = False):
+    """Claims and runs jobs until interrupted (or until no job is queued or running with `exit_when_empty`)."""
+    conn = connect(db_path)
+    try:
+        while True:
+            if not process_one(conn, handler, worker_id, db_path, lease_s):
+                # Running jobs may still come back if their worker dies, and batched jobs once their
+                # batch is collected, so only a fully idle queue is drained.
+                counts = depth(conn)
+                if exit_when_empty and not (counts["running"] or counts["batched"]):
+                    return
+                time.sleep(poll_s)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+
+def run_workers(handler: Callable, concurrency: int = 1, db_path: Path = None, lease_s: float = DEFAULT_LEASE_S,
+                poll_s: float = DEFAULT_POLL_S, exit_when_empty: bool = False):
+    """
+    Runs `concurrency` worker processes and restarts any that crash. `handler` must be a
+    module-level function so it can be pickled into the worker processes.
+    """
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    slots = {}
+
+    def spawn(slot: int):
+        worker_id = f"{prefix}:{slot}"
+        proc = multiprocessing.Process(
+            target=worker_loop, name=worker_id,
+            args=(handler, worker_id, db_path, lease_s, poll_s, exit_when_empty)
+        )
+        proc.start()
+        slots[slot] = proc
+
+    for slot in range(concurrency):
+        spawn(slot)
+    try:
+        while slots:
+            time.sleep(poll_s)
+            for slot, proc in list(slots.items()):
+                if proc.is_alive():
+                    continue
+                if proc.exitcode == 0:
+                    del slots[slot]
+                else:
+                    # Its job stays leased until the lease expires, then another worker retries it.
+                    print(f"⚠️ Worker {proc.name} exited with code {proc.exitcode}; restarting.")
+                    spawn(slot)
+    except KeyboardInterrupt:
+        print("Stopping workers...")
+        for proc in slots.values():
+            proc.join(timeout=lease_s)
@@ -0,0 +1,275 @@
+"""
+In-process secret (credential leak) scanner for LLM-generated changes.
+
+Rules use the gitleaks rule format (id, description, regex, secretGroup, entropy,
+keywords, allowlists) so an existing `.gitleaks.toml` can be loaded as-is. Like
+gitleaks, rules are prefiltered with one compiled keyword pattern, matches are
+checked against Shannon entropy, and findings are reported with gitleaks field names.
+"""
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+GITLEAKS_CONFIG = Path(".gitleaks.toml")
+# Payloads larger than this (in total characters) are scanned on a thread pool.
+PARALLEL_THRESHOLD_CHARS = 256_000
+MAX_WORKERS = 8
+CACHE_SIZE = 1024
+
+# A subset of the default gitleaks rules covering the credentials this project handles.
+DEFAULT_RULES = [
+    {
+        "id": "aws-access-token",
+        "description": "AWS access key ID",
+        "regex": r"\b((?:A3T[A-Z0-9]|AKIA|ASIA|ABIA|ACCA)[A-Z0-9]{16})\b",
+        "entropy": 3.0,
+        "keywords": ["a3t", "akia", "asia", "abia", "acca"],
+    },
+    {
+        "id": "github-pat",
+        "description": "GitHub personal access token",
+        "regex": r"ghp_[0-9a-zA-Z]{36}",
+        "entropy": 3.0,
+        "keywords": ["ghp_"],
+    },
+    {
+        "id": "github-fine-grained-pat",
+        "description": "GitHub fine-grained personal access token",
+        "regex": r"github_pat_\w{82}",
+        "entropy": 3.0,
+        "keywords": ["github_pat_"],
+    },
+    {
+        "id": "anthropic-api-key",
+        "description": "Anthropic API key",
+        "regex": r"\b(sk-ant-(?:api03|admin01)-[a-zA-Z0-9_\-]{93}AA)(?:[\x60'\"\s;]|\\[nr]|$)",
+        "keywords": ["sk-ant-api03", "sk-ant-admin01"],
+    },
+    {
+        "id": "openai-api-key",
+        "description": "OpenAI API key",
+        "regex": r"\b(sk-(?:(?:proj|svcacct|admin)-[A-Za-z0-9_-]{58,74}T3BlbkFJ[A-Za-z0-9_-]{58,74}|[a-zA-Z0-9]{20}T3BlbkFJ[a-zA-Z0-9]{20}))(?:[\x60'\"\s;]|\\[nr]|$)",
+        "entropy": 3.0,
+        "keywords": ["t3blbkfj"],
+    },
+    {
+        "id": "slack-token",
+        "description": "Slack token",
+        "regex": r"xox[baprs]-[0-9a-zA-Z-]{10,48}",
+        "keywords": ["xoxb", "xoxa", "xoxp", "xoxr", "xoxs"],
+    },
+    {
+        "id": "stripe-access-token",
+        "description": "Stripe access token",
+        "regex": r"\b((?:sk|rk)_(?:test|live|prod)_[a-zA-Z0-9]{10,99})(?:[\x60'\"\s;]|\\[nr]|$)",
+        "entropy": 2.0,
+        "keywords": ["sk_test", "sk_live", "sk_prod", "rk_test", "rk_live", "rk_prod"],
+    },
+    {
+        "id": "private-key",
+        "description": "Private key",
+        "regex": r"(?i)-----BEGIN[ A-Z0-9_-]{0,100}PRIVATE KEY(?: BLOCK)?-----[\s\S-]{64,}?KEY(?: BLOCK)?-----",
+        "keywords": ["-----begin"],
+    },
+    {
+        "id": "generic-api-key",
+        "description": "Generic API key",
+        "regex": r"(?i)[\w.-]{0,50}?(?:access|auth|api|credential|creds|key|passwd|password|secret|token)(?:[ \t\w.-]{0,20})[\s'\"]{0,3}(?:=|>|:{1,3}=|\|\||:|=>|\?=|,)[\x60'\"\s=]{0,5}([\w.=-]{10,150})(?:[\x60'\"\s;]|\\[nr]|$)",
+        "secretGroup": 1,
+        "entropy": 3.5,
+        "keywords": ["access", "api", "auth", "key", "credential", "creds", "passwd", "password", "secret", "token"],
+        "allowlists": [{
+            "regexes": [
+                # From the gitleaks rule: values without digits are identifiers, not keys.
+                r"^[a-zA-Z_.-]+$",
+                # Identifiers and attribute chains whose parts end in at most two digits
+                # (OPENAI_KEY_V2, settings.s3_token); random keys mix digits into every part.
+                r"^[A-Za-z]+[0-9]{0,2}(?:[_.-]+[A-Za-z]*[0-9]{0,2})*$",
+                # Call expressions, e.g. os.getenv(...).
+                r"^[A-Za-z_][A-Za-z0-9_.]*\(",
+            ],
+            "stopwords": ["example", "placeholder", "changeme", "your_", "xxxx"],
+        }],
+    },
+]
+
+
+def shannon_entropy(data: str) -> float:
+    """Shannon entropy in bits per character, as used by gitleaks."""
+    if not data:
+        return 0.0
+    counts = Counter(data)
+    return -sum((n / len(data)) * math.log2(n / len(data)) for n in counts.values())
+
+
+def _compile_allowlist(allowlist: Dict) -> Dict:
+    return {
+        "regexes": [re.compile(r) for r in allowlist.get("regexes", [])],
+        "paths": [re.compile(p) for p in allowlist.get("paths", [])],
+        "stopwords": [w.lower() for w in allowlist.get("stopwords", [])],
+    }
+
+
+def _is_allowed(allowlists: List[Dict], secret: str, path: str) -> bool:
+    for allowlist in allowlists:
+        if any(r.search(secret) for r in allowlist["regexes"]):
+            return True
+        if path and any(p.search(path) for p in allowlist["paths"]):
+            return True
+        if any(word in secret.lower() for word in allowlist["stopwords"]):
+            return True
+    return False
+
+
+class RuleSet:
+    """A compiled set of gitleaks-format rules plus a single keyword prefilter."""
+
+    def __init__(self, config: Dict):
+        self.rules = []
+        self.skipped = []
+        for rule in config.get("rules", []):
+            if "regex" not in rule:
+                # Path-only rules flag file names, not content.
+                continue
+            try:
+                pattern = re.compile(rule["regex"])
+            except re.error as e:
+                # Go RE2 syntax that Python's `re` doesn't support.
+                self.skipped.append(f"{rule.get('id', '?')}: {e}")
+                continue
+            allowlists = rule.get("allowlists") or ([rule["allowlist"]] if "allowlist" in rule else [])
+            self.rules.append({
+                "id": rule.get("id", "unnamed-rule"),
+                "description": rule.get("description", ""),
+                "pattern": pattern,
+                "secret_group": rule.get("secretGroup", 0),
+                "entropy": rule.get("entropy", 0.0),
+                "keywords": [k.lower() for k in rule.get("keywords", [])],
+                "path": re.compile(rule["path"]) if rule.get("path") else None,
+                "allowlists": [_compile_allowlist(a) for a in allowlists],
+            })
+        self.global_allowlists = [_compile_allowlist(config["allowlist"])] if "allowlist" in config else []
+
+        keywords = sorted({k for rule in self.rules for k in rule["keywords"]}, key=len, reverse=True)
+        self.keyword_pattern = re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE) if keywords else None
+        self.fingerprint = sha256(repr(config).encode("utf-8")).hexdigest()
+
+    def candidate_rules(self, content: str) -> List[Dict]:
+        """Rules worth running on `content`: those without keywords plus those whose keyword occurs."""
+        present = {m.group(0).lower() for m in self.keyword_pattern.finditer(content)} if self.keyword_pattern else set()
+        return [r for r in self.rules if not r["keywords"] or present.intersection(r["keywords"])]
+
+    def scan(self, content: str, path: str = "") -> List[Dict]:
+        """Returns gitleaks-style findings for `content` (secrets redacted)."""
+        findings = []
+        # Rules run in order, so a specific rule's hit isn't reported again by a generic one.
+        seen_secrets = set()
+        for rule in self.candidate_rules(content):
+            if rule["path"] and not rule["path"].search(path):
+                continue
+            for match in rule["pattern"].finditer(content):
+                group = rule["secret_group"] or (1 if match.re.groups else 0)
+                secret = match.group(group) or match.group(0)
+                entropy = shannon_entropy(secret)
+                if rule["entropy"] and entropy < rule["entropy"]:
+                    continue
+                if secret in seen_secrets or _is_allowed(rule["allowlists"] + self.global_allowlists, secret, path):
+                    continue
+                seen_secrets.add(secret)
+                start_line = content.count("\n", 0, match.start()) + 1
+                line_start = content.rfind("\n", 0, match.start()) + 1
+                findings.append({
+                    "RuleID": rule["id"],
+                    "Description": rule["description"],
+                    "StartLine": start_line,
+                    "EndLine": start_line + match.group(0).count("\n"),
+                    "StartColumn": match.start() - line_start + 1,
+                    "EndColumn": match.start() - line_start + len(match.group(0)),
+                    "Match": match.group(0).replace(secret, "REDACTED"),
+                    "Secret": "REDACTED",
+                    "Entropy": round(entropy, 4),
+                })
+        return findings
+
+
+def load_rules(config_path: Optional[Path] = None) -> RuleSet:
+    """Loads a gitleaks TOML config if one exists, otherwise the built-in default rules."""
+    path = config_path or GITLEAKS_CONFIG
+    if path.exists():
+        with open(path, "rb") as f:
+            return RuleSet(tomllib.load(f))
+    return RuleSet({"rules": DEFAULT_RULES})
+
+
+_cache: "OrderedDict[tuple, List[Dict]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_default_rules: Optional[RuleSet] = None
+
+
+def _scan_cached(rules: RuleSet, content: str, path: str) -> List[Dict]:
+    """Scans `content`, reusing earlier results for identical content under the same rules."""
+    # Path-scoped rules and path allowlists make results depend on the path too.
+    key = (rules.fingerprint, sha256(content.encode("utf-8")).hexdigest(), path)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    findings = rules.scan(content, path)
+    with _cache_lock:
+        _cache[key] = findings
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return findings
+
+
+def added_text(change: Dict) -> str:
+    """The text a change introduces: full content, patch replacements or added diff lines."""
+    if change.get("action") == "patch":
+        if change.get("hunks"):
+            return "\n".join(h.get("replace", "") for h in change["hunks"])
+        return "\n".join(line[1:] for line in change.get("diff", "").splitlines() if line.startswith("+") and not line.startswith("+++"))
+    return change.get("content", "") or ""
+
+
+def scan_changes(changes: List[Dict], rules: Optional[RuleSet] = None) -> List[Dict]:
+    """
+    Scans the text added by every change in memory and returns gitleaks-style findings
+    with a `File` and `Fingerprint`. Large payloads are scanned on a thread pool.
+    """
+    global _default_rules
+    if rules is None:
+        if _default_rules is None:
+            _default_rules = load_rules()
+        rules = _default_rules
+
+    items = [(change.get("file", ""), added_text(change)) for change in changes if isinstance(change, dict)]
+    if sum(len(text) for _, text in items) > PARALLEL_THRESHOLD_CHARS and len(items) > 1:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(items))) as pool:
+            results = list(pool.map(lambda item: _scan_cached(rules, item[1], item[0]), items))
+    else:
+        results = [_scan_cached(rules, text, path) for path, text in items]
+
+    findings = []
+    for (path, _), file_findings in zip(items, results):
+        for finding in file_findings:
+            findings.append({**finding, "File": path, "Fingerprint": f"{path}:{finding['RuleID']}:{finding['StartLine']}"})
+    return findings
+
+
+def format_findings(findings: List[Dict]) -> str:
+    """Correction feedback for the dev node describing where secrets were found."""
+    lines = [f"Potential secrets were found in the generated changes ({len(findings)} finding(s)). "
+             "Remove them and read credentials from environment variables instead:"]
+    for f in findings:
+        lines.append(f"- {f['File']}:{f['StartLine']}:{f['StartColumn']} [{f['RuleID']}] {f['Description']}: {f['Match']}")
+    return "\n".join(lines)
@@ -0,0 +1,231 @@
+"""
+Indexed query surface over the observability log.
+
+`artifacts/logs/observability_log.csv` stays the append-only source of truth; this module
+mirrors it into an SQLite database indexed by thread, run, task and time. Each sync
+only reads the bytes appended since the previous one, so `vibe stats` stays fast after
+months of logs. A log that was rotated, truncated or migrated is re-indexed from scratch.
+"""
+import csv
+import io
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from utils.observability import LOG_FILE
+
+INDEX_DB = LOG_FILE.parent / "metrics_index.db"
+SYNC_BLOCK_BYTES = 8 << 20
+GROUP_COLUMNS = ("thread_id", "run_id", "iteration", "node_name", "model", "task_id", "status")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    ts TEXT NOT NULL,
+    node_name TEXT NOT NULL,
+    status TEXT,
+    latency_ms REAL,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    cost_usd REAL,
+    is_fallback INTEGER,
+    thread_id TEXT,
+    run_id TEXT,
+    iteration INTEGER,
+    model TEXT,
+    task_id TEXT,
+    task TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+INDEXES = {
+    "idx_metrics_thread": "metrics (thread_id, ts)",
+    "idx_metrics_run": "metrics (run_id)",
+    "idx_metrics_task": "metrics (task_id)",
+    "idx_metrics_ts": "metrics (ts)",
+}
+
+
+def connect(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    path = Path(db_path or INDEX_DB)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    _create_indexes(conn)
+    return conn
+
+
+def _create_indexes(conn: sqlite3.Connection):
+    for name, target in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+# --- Sync ---
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_row(record: Dict) -> tuple:
+    return (
+        record.get("timestamp", ""),
+        record.get("node_name", ""),
+        record.get("status", ""),
+        _float(record.get("latency_ms")),
+        _int(record.get("input_tokens")) or 0,
+        _int(record.get("output_tokens")) or 0,
+        _float(record.get("cost_usd")),
+        int(record.get("is_fallback") == "True"),
+        record.get("thread_id") or None,
+        record.get("run_id") or None,
+        _int(record.get("iteration")),
+        record.get("model") or None,
+        record.get("task_id") or None,
+        record.get("task") or None,
+    )
+
+
+def sync(conn: sqlite3.Connection, log_file: Optional[Path] = None) -> int:
+    """Indexes log lines appended since the last sync. Returns the number of new rows."""
+    log_file = Path(log_file or LOG_FILE)
+    if not log_file.exists():
+        return 0
+    # Serializes concurrent syncs so no log line is indexed twice.
+    conn.execute("BEGIN IMMEDIATE")
+    stat = log_file.stat()
+    saved = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+    source = json.loads(saved["value"]) if saved else {}
+    rebuild = source.get("inode") != stat.st_ino or source.get("offset", 0) > stat.st_size
+    if rebuild:
+        # Bulk-loading into an unindexed table and indexing afterwards is several times faster.
+        conn.execute("DELETE FROM metrics")
+        for name in INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        source = {"inode": stat.st_ino, "offset": 0, "columns": None}
+
+    rows = []
+    with open(log_file, "rb") as f:
+        f.seek(source["offset"])
+        while True:
+            block = f.read(SYNC_BLOCK_BYTES)
+            complete = block[:block.rfind(b"\n") + 1]
+            if not complete:
+                break  # nothing new, or a writer is mid-line; pick it up next time
+            source["offset"] += len(complete)
+            f.seek(source["offset"])
+            reader = csv.reader(io.StringIO(complete.decode("utf-8")))
+            if source["columns"] is None:
+                source["columns"] = next(reader)
+            columns = source["columns"]
+            rows.extend(_to_row(dict(zip(columns, fields))) for fields in reader if fields)
+    conn.executemany(f"INSERT INTO metrics VALUES ({', '.join('?' * 14)})", rows)
+    if rebuild:
+        _create_indexes(conn)
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)", (json.dumps(source),))
+    conn.commit()
+    return len(rows)
+
+
+# --- Queries ---
+
+def _where(thread_id=None, run_id=None, task_id=None, since_days=None):
+    clauses, params = [], []
+    for column, value in (("thread_id", thread_id), ("run_id", run_id), ("task_id", task_id)):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since_days is not None:
+        clauses.append("ts >= ?")
+        params.append((datetime.utcnow() - timedelta(days=since_days)).isoformat())
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def breakdown(conn: sqlite3.Connection, group_by: Sequence[str] = ("run_id", "iteration", "node_name", "model"),
+              thread_id: str = None, run_id: str = None, task_id: str = None,
+              since_days: float = None) -> List[Dict]:
+    """Calls, latency, tokens and cost grouped by `group_by` columns, in order of first occurrence."""
+    unknown = set(group_by) - set(GROUP_COLUMNS)
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(sorted(unknown))}; choose from {', '.join(GROUP_COLUMNS)}")
+    columns = ", ".join(group_by)
+    where, params = _where(thread_id, run_id, task_id, since_days)
+    query = f"""
+        SELECT {columns + ',' if columns else ''}
+               COUNT(*) AS calls,
+               SUM(status IN ('success', 'hit')) AS succeeded,
+               SUM(latency_ms) AS latency_ms,
+               MAX(latency_ms) AS max_latency_ms,
+               SUM(input_tokens + output_tokens) AS tokens,
+               SUM(cost_usd) AS cost_usd,
+               MIN(ts) AS first_ts
+        FROM metrics{where}
+        {'GROUP BY ' + columns if columns else ''}
+        ORDER BY first_ts
+    """
+    return [dict(row) for row in conn.execute(query, params)]
+
+
+def top_threads(conn: sqlite3.Connection, since_days: float = None, limit: int = 20) -> List[Dict]:
+    """Threads ordered by total cost, with their task, run count and total latency."""
+    where, params = _where(since_days=since_days)
+    where = (where + " AND" if where else " WHERE") + " thread_id IS NOT NULL"
+    query = f"""
+        SELECT thread_id,
+               MAX(task) AS task,
+               COUNT(DISTINCT run_id) AS runs,
+               MAX(iteration) AS iterations,
+               COUNT(*) AS calls,
+               SUM(latency_ms) AS latency_ms,
+               SUM(input_tokens + output_tokens) AS tokens,
+               SUM(cost_usd) AS cost_usd,
+               MAX(ts) AS last_ts
+        FROM metrics{where}
+        GROUP BY thread_id
+        ORDER BY cost_usd DESC
+        LIMIT ?
+    """
+    return [dict(row) for row in conn.execute(query, params + [limit])]
+
+
+def fetch_rows(conn: sqlite3.Connection, node_names: Sequence[str], since_days: float = None) -> List[Dict]:
+    """Raw run-attributed rows of the given nodes, oldest first (e.g. for learning from past runs)."""
+    where, params = _where(since_days=since_days)
+    where = (where + " AND" if where else " WHERE") + \
+        f" run_id IS NOT NULL AND node_name IN ({', '.join('?' * len(node_names))})"
+    query = f"""
+        SELECT ts, node_name, status, latency_ms, cost_usd, is_fallback, run_id, iteration, model, task
+        FROM metrics{where}
+        ORDER BY ts
+    """
+    return [dict(row) for row in conn.execute(query, params + list(node_names))]
+
+
+def stats(group_by: Sequence[str] = None, thread_id: str = None, run_id: str = None, task_id: str = None,
+          since_days: float = None, limit: int = 20, db_path: Optional[Path] = None) -> Dict:
+    """Syncs the index and answers a `vibe stats` query."""
+    start = time.time()
+    conn = connect(db_path)
+    try:
+        new_rows = sync(conn)
+        if thread_id or run_id or task_id or group_by:
+            rows = breakdown(conn, group_by or ("run_id", "iteration", "node_name", "model"),
+                             thread_id, run_id, task_id, since_days)
+        else:
+            rows = top_threads(conn, since_days, limit)
+    finally:
+        conn.close()
+    return {"rows": rows, "indexed_rows": new_rows, "query_ms": round((time.time() - start) * 1000, 1)}
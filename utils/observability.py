@@ -1,10 +1,23 @@
 import csv
+import functools
+import gc
+import hashlib
+import json
 import os
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+
+from utils.file_lock import file_lock
 
 LOG_FILE = Path("artifacts/logs/observability_log.csv")
+QUEUE_LOG_FILE = Path("artifacts/logs/queue_log.csv")
+MEMORY_LOG_FILE = Path("artifacts/logs/memory_log.csv")
 BUDGET_FILE = Path("artifacts/logs/budget_tracker.json")
 
 # Placeholder costs per 1 million tokens (input/output)
@@ -13,17 +26,101 @@ MODEL_COSTS = {
     "claude-4-sonnet": (3.0, 15.0),
     "claude-3-haiku": (0.25, 1.25),
 }
+# Provider spellings of the models above. Dated snapshots ("claude-3-haiku-20240307")
+# and provider prefixes ("anthropic/...") are handled by `resolve_model_costs`.
+MODEL_ALIASES = {
+    "claude-sonnet-4": "claude-4-sonnet",
+}
+
+LOG_COLUMNS = [
+    "timestamp", "node_name", "status", "latency_ms",
+    "input_tokens", "output_tokens", "total_tokens", "cost_usd", "is_fallback",
+    "thread_id", "run_id", "iteration", "model", "task_id", "task",
+]
+TASK_LOG_CHARS = 200
+
+# --- Run Context ---
+# Set once per run by graph.app.run_task and per node by @with_run_context, so every
+# log_metric() call is tagged with the run it belongs to without threading IDs through.
+_RUN_CONTEXT: ContextVar[Dict] = ContextVar("vibe_run_context", default={})
+
+
+def task_id_for(task: str) -> str:
+    return hashlib.sha256(task.encode("utf-8")).hexdigest()[:12]
+
+
+def current_run_context() -> Dict:
+    return _RUN_CONTEXT.get()
+
+
+@contextmanager
+def run_context(**fields):
+    """Adds `fields` (thread_id, run_id, iteration, task, ...) to the run context for the block."""
+    token = _RUN_CONTEXT.set({**_RUN_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _RUN_CONTEXT.reset(token)
+
+
+def annotate_run(**fields):
+    """Updates the run context until the enclosing `run_context` block ends (e.g. a new iteration)."""
+    _RUN_CONTEXT.set({**_RUN_CONTEXT.get(), **fields})
+
+
+def with_run_context(node):
+    """Node decorator: tags the node's metrics with the thread, task and iteration in its state."""
+    @functools.wraps(node)
+    def wrapper(state, *args, **kwargs):
+        context = current_run_context()
+        fields = {"iteration": state.get("iteration", state.get("fanout_round", 0))}
+        if state.get("thread_id") and not context.get("thread_id"):
+            fields["thread_id"] = state["thread_id"]
+        if state.get("task") and not context.get("task"):
+            fields["task"] = state["task"]
+        with run_context(**fields):
+            if not _memory_settings["enabled"]:
+                return node(state, *args, **kwargs)
+            with memory_probe(node.__name__.removesuffix("_node")):
+                return node(state, *args, **kwargs)
+    return wrapper
+
+
+# --- Metrics Log ---
+
+_header_checked = False
+
+
+def _migrate_log_file(header):
+    """Rewrites a log written with an older header in the current column layout (new columns empty)."""
+    tmp = LOG_FILE.with_name(f".{LOG_FILE.name}.{os.getpid()}.tmp")
+    with open(LOG_FILE, "r", newline="", encoding="utf-8") as src, open(tmp, "w", newline="", encoding="utf-8") as dst:
+        reader, writer = csv.reader(src), csv.writer(dst)
+        next(reader, None)
+        writer.writerow(LOG_COLUMNS)
+        for row in reader:
+            record = dict(zip(header, row))
+            writer.writerow([record.get(column, "") for column in LOG_COLUMNS])
+    os.replace(tmp, LOG_FILE)
+    print(f"ℹ️ Migrated {LOG_FILE} to the current column layout.")
+
 
 def ensure_log_file():
-    """Ensures the log file and its directory exist with a header."""
+    """
+    Ensures the log file and its directory exist with the current header, migrating older logs.
+    Callers hold file_lock(LOG_FILE), so no worker appends to a file that is being migrated.
+    """
+    global _header_checked
     LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
     if not LOG_FILE.exists():
-        with open(LOG_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "timestamp", "node_name", "status", "latency_ms",
-                "input_tokens", "output_tokens", "total_tokens", "cost_usd", "is_fallback"
-            ])
+        with open(LOG_FILE, 'w', newline='', encoding="utf-8") as f:
+            csv.writer(f).writerow(LOG_COLUMNS)
+    elif not _header_checked:
+        with open(LOG_FILE, "r", newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        if header != LOG_COLUMNS:
+            _migrate_log_file(header)
+    _header_checked = True
 
 def log_metric(
     node_name: str,
@@ -32,27 +129,248 @@ def log_metric(
     input_tokens: int = 0,
     output_tokens: int = 0,
     cost_usd: float = 0.0,
-    is_fallback: bool = False
+    is_fallback: bool = False,
+    model: str = ""
+):
+    """Logs a metric entry to the CSV file, tagged with the current run context."""
+    context = current_run_context()
+    task = " ".join(str(context.get("task", "")).split())
+    with file_lock(LOG_FILE):
+        ensure_log_file()
+        with open(LOG_FILE, 'a', newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([
+                datetime.utcnow().isoformat(),
+                node_name,
+                status,
+                round(latency_ms, 2),
+                input_tokens,
+                output_tokens,
+                input_tokens + output_tokens,
+                round(cost_usd, 6),
+                is_fallback,
+                context.get("thread_id", ""),
+                context.get("run_id", ""),
+                context.get("iteration", ""),
+                model,
+                task_id_for(task) if task else "",
+                task[:TASK_LOG_CHARS],
+            ])
+
+def log_queue_metric(
+    event: str,
+    thread_id: str,
+    worker_id: str,
+    queue_depth: int,
+    running: int,
+    wait_ms: float = 0.0,
+    run_ms: float = 0.0,
+    attempts: int = 0
 ):
-    """Logs a metric entry to the CSV file."""
-    ensure_log_file()
-    with open(LOG_FILE, 'a', newline='', encoding="utf-8") as f:
+    """
+    Logs a job-queue event (enqueue/claim/complete/retry/fail/lost_lease) with the queue depth at that
+    moment. Wait time (enqueue -> claim) and depth are the signals for scaling workers.
+    """
+    QUEUE_LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    new_file = not QUEUE_LOG_FILE.exists()
+    with open(QUEUE_LOG_FILE, 'a', newline='', encoding="utf-8") as f:
         writer = csv.writer(f)
+        if new_file:
+            writer.writerow([
+                "timestamp", "event", "thread_id", "worker_id", "queue_depth",
+                "running", "wait_ms", "run_ms", "attempts"
+            ])
         writer.writerow([
             datetime.utcnow().isoformat(),
-            node_name,
-            status,
-            round(latency_ms, 2),
-            input_tokens,
-            output_tokens,
-            input_tokens + output_tokens,
-            round(cost_usd, 6),
-            is_fallback
+            event,
+            thread_id,
+            worker_id,
+            queue_depth,
+            running,
+            round(wait_ms, 2),
+            round(run_ms, 2),
+            attempts
         ])
 
+# --- Memory Instrumentation ---
+# Opt-in (`observability.memory` in the spec, or VIBE_MEMORY_PROFILE=1): every node decorated
+# with @with_run_context logs its traced allocation delta and RSS change, and the end of each
+# task is snapshotted after a full GC to spot memory that keeps growing across tasks in a
+# long-lived worker. tracemalloc is process-wide, so nodes running concurrently (best-of-N
+# candidates) see each other's allocations.
+
+MEMORY_LOG_COLUMNS = [
+    "timestamp", "scope", "name", "thread_id", "run_id", "iteration",
+    "alloc_delta_kb", "traced_kb", "traced_peak_kb", "rss_kb", "rss_delta_kb", "top_sites", "warning",
+]
+DEFAULT_MEMORY_SETTINGS = {
+    "enabled": False,
+    "top_sites": 5,
+    "node_sites": False,
+    "frames": 1,
+    "growth_tasks": 5,
+    "growth_min_mb": 5.0,
+}
+_memory_settings = dict(DEFAULT_MEMORY_SETTINGS, enabled=os.getenv("VIBE_MEMORY_PROFILE", "") == "1")
+_memory_lock = threading.Lock()
+# The current growth streak: its first task-end sample (traced_bytes, rss_bytes) and snapshot,
+# the number of tasks since, and the previous task's snapshot and RSS.
+_growth = {"start": None, "baseline": None, "tasks": 0, "previous": None, "previous_rss": None}
+_IGNORED_FRAMES = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+
+
+def configure_memory_profiling(settings: Optional[Dict] = None):
+    """Applies `observability.memory` from the spec. VIBE_MEMORY_PROFILE=1/0 overrides `enabled`."""
+    _memory_settings.update(DEFAULT_MEMORY_SETTINGS)
+    _memory_settings.update(settings or {})
+    if os.getenv("VIBE_MEMORY_PROFILE") in ("0", "1"):
+        _memory_settings["enabled"] = os.getenv("VIBE_MEMORY_PROFILE") == "1"
+    if _memory_settings["enabled"] and not tracemalloc.is_tracing():
+        tracemalloc.start(int(_memory_settings["frames"]))
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process (psutil if installed, else /proc), or None if unavailable."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_IGNORED_FRAMES)
+
+
+def top_allocation_sites(after: tracemalloc.Snapshot, before: tracemalloc.Snapshot, limit: int) -> Tuple[int, List[str]]:
+    """Net allocated bytes between two snapshots and the `limit` source lines that grew the most."""
+    diff = after.compare_to(before, "lineno")
+    total = sum(stat.size_diff for stat in diff)
+    cwd = os.getcwd() + os.sep
+    sites = []
+    for stat in sorted(diff, key=lambda stat: stat.size_diff, reverse=True)[:limit]:
+        if stat.size_diff <= 0:
+            break
+        frame = stat.traceback[0]
+        sites.append(f"{frame.filename.replace(cwd, '')}:{frame.lineno} +{stat.size_diff / 1024:.1f}KB ({stat.count_diff:+d} blocks)")
+    return total, sites
+
+
+def _kb(value: Optional[float]):
+    return "" if value is None else round(value / 1024, 1)
+
+
+def log_memory(scope: str, name: str, alloc_delta: Optional[int], rss: Optional[int], rss_delta: Optional[int],
+               top_sites: List[str], warning: str = ""):
+    """Appends a memory sample, tagged with the current run context, to MEMORY_LOG_FILE."""
+    context = current_run_context()
+    traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+    with _memory_lock:
+        MEMORY_LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+        new_file = not MEMORY_LOG_FILE.exists()
+        with open(MEMORY_LOG_FILE, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(MEMORY_LOG_COLUMNS)
+            writer.writerow([
+                datetime.utcnow().isoformat(), scope, name,
+                context.get("thread_id", ""), context.get("run_id", ""), context.get("iteration", ""),
+                _kb(alloc_delta), _kb(traced), _kb(peak), _kb(rss), _kb(rss_delta),
+                json.dumps(top_sites, ensure_ascii=False), warning,
+            ])
+
+
+@contextmanager
+def memory_probe(name: str):
+    """
+    Logs the traced allocation delta and RSS change of the enclosed block. Its top allocation
+    sites are only recorded with `node_sites`, as that takes two full snapshots per node.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(int(_memory_settings["frames"]))
+    with_sites = bool(_memory_settings["node_sites"])
+    before = _snapshot() if with_sites else None
+    rss_before, traced_before = current_rss_bytes(), tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        rss_after, delta = current_rss_bytes(), tracemalloc.get_traced_memory()[0] - traced_before
+        sites = []
+        if with_sites:
+            delta, sites = top_allocation_sites(_snapshot(), before, int(_memory_settings["top_sites"]))
+        rss_delta = rss_after - rss_before if rss_after is not None and rss_before is not None else None
+        log_memory("node", name, delta, rss_after, rss_delta, sites)
+
+
+def record_task_memory():
+    """
+    Samples memory after a task (after a full GC) with the sites that grew since the previous
+    task, and warns when it has stayed above the streak's starting point for `growth_tasks`
+    consecutive tasks and grown by at least `growth_min_mb`, listing the sites that grew over
+    the streak. No-op unless profiling is enabled.
+    """
+    if not _memory_settings["enabled"] or not tracemalloc.is_tracing():
+        return
+    gc.collect()
+    traced, rss = tracemalloc.get_traced_memory()[0], current_rss_bytes()
+    snapshot = _snapshot()
+    limit = int(_memory_settings["top_sites"])
+    with _memory_lock:
+        previous, previous_rss = _growth["previous"], _growth["previous_rss"]
+        # Compared with the streak's start rather than the previous task, so a task that frees a
+        # little more than the last one doesn't hide a leak; only falling back to the start does.
+        if _growth["start"] is None or traced <= _growth["start"][0]:
+            _growth.update(start=(traced, rss), baseline=snapshot, tasks=0)
+        else:
+            _growth["tasks"] += 1
+        _growth["previous"], _growth["previous_rss"] = snapshot, rss
+        streak, baseline, first_rss = _growth["tasks"], _growth["baseline"], _growth["start"][1]
+
+    delta, sites = top_allocation_sites(snapshot, previous, limit) if previous is not None else (None, [])
+    warning = ""
+    if streak >= int(_memory_settings["growth_tasks"]):
+        growth, growth_sites = top_allocation_sites(snapshot, baseline, limit)
+        if growth >= float(_memory_settings["growth_min_mb"]) * 1_048_576:
+            rss_note = f", RSS {(rss - first_rss) / 1_048_576:+.1f}MB" if rss is not None and first_rss is not None else ""
+            warning = f"traced memory grew {growth / 1_048_576:.1f}MB over {streak} consecutive tasks{rss_note}"
+            print(f"⚠️ Possible memory leak: {warning}. Top growth sites:\n  " + "\n  ".join(growth_sites))
+    rss_delta = rss - previous_rss if rss is not None and previous_rss is not None else None
+    log_memory("task", "task", delta, rss, rss_delta, sites, warning)
+
+
+@functools.lru_cache(maxsize=256)
+def resolve_model_costs(model_name: str) -> Optional[Tuple[float, float]]:
+    """
+    Per-million-token (input, output) prices for `model_name`, or None if unknown.
+    Tries the exact name, aliases, the name without a provider prefix or snapshot suffix
+    (`-20240307`, `-latest`), then the longest known model name it starts with (with a warning,
+    since variants like `gpt-5-mini` rarely share their base model's price).
+    """
+    name = model_name.strip().lower()
+    name = re.split(r"[/:]", name)[-1]
+    candidates = [name, re.sub(r"-(\d{8}|\d{4}-\d{2}-\d{2}|latest)$", "", name)]
+    for candidate in candidates:
+        candidate = MODEL_ALIASES.get(candidate, candidate)
+        if candidate in MODEL_COSTS:
+            return MODEL_COSTS[candidate]
+    prefixes = [known for known in list(MODEL_COSTS) + list(MODEL_ALIASES) if name.startswith(known + "-")]
+    if prefixes:
+        # A variant such as gpt-5-mini is usually priced differently from its base model.
+        longest = max(prefixes, key=len)
+        print(f"⚠️ No price known for model '{model_name}'; using the '{longest}' rates, which may not match. "
+              "Add it to MODEL_COSTS or MODEL_ALIASES.")
+        return MODEL_COSTS[MODEL_ALIASES.get(longest, longest)]
+    print(f"⚠️ No price known for model '{model_name}'; its cost is logged as 0. Add it to MODEL_COSTS or MODEL_ALIASES.")
+    return None
+
 def calculate_cost(model_name: str, input_tokens: int, output_tokens: int) -> float:
     """Calculates the cost of an LLM call based on predefined rates."""
-    input_cost_per_mil, output_cost_per_mil = MODEL_COSTS.get(model_name, (0.0, 0.0))
+    input_cost_per_mil, output_cost_per_mil = resolve_model_costs(model_name) or (0.0, 0.0)
     cost = ((input_tokens / 1_000_000) * input_cost_per_mil) + \
            ((output_tokens / 1_000_000) * output_cost_per_mil)
     return cost